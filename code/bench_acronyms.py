@@ -0,0 +1,121 @@
+#! /usr/bin/env python3
+#
+# Measure the speed of the search of acronym definitions in find_acronyms.py
+#
+# USAGE: bench_acronyms.py [NUM_SENTENCES]
+#
+# Compare find_acronyms.extract(), which looks for the words whose initials
+# create an acronym with a single substring search in the initials of the
+# sentence, with the previous implementation, which compared the initials of
+# every window of words before the acronym, letter by letter. The synthetic
+# sentences are long and dense with gene symbols in parentheses, some of them
+# preceded by their definition. Both must return the same acronyms.
+
+import random
+import sys
+import time
+
+from dstruct.Sentence import Sentence
+from find_acronyms import extract, inverted_long_names, merged_genes_dict
+
+
+# The previous implementation of the second method of find_acronyms.extract()
+# (the sentences of the benchmark do not start with "Abbreviations")
+def extract_before(sentence):
+    acronyms = []
+    for word in sentence.words[1:-1]:
+        acronym = None
+        if word.word in merged_genes_dict and \
+                word.word not in inverted_long_names and \
+                word.word.isupper() and word.word.isalpha() and \
+                len(word.word) >= 2 and \
+                ((sentence.words[word.in_sent_idx - 1].word == "(" and
+                  sentence.words[word.in_sent_idx + 1].word in [
+                  ")", ";" ",", "]"]) or
+                 (sentence.words[word.in_sent_idx - 1].word == "[" and
+                  sentence.words[word.in_sent_idx + 1].word == "]")):
+            word_idx = word.in_sent_idx
+            window_size = len(word.word)
+            start_idx = 0
+            while start_idx + window_size - 1 < word_idx:
+                window_words = sentence.words[start_idx:(start_idx +
+                                                         window_size)]
+                is_definition = True
+                for window_index in range(window_size):
+                    if window_words[window_index].word[0].lower() != \
+                            word.word[window_index].lower():
+                        is_definition = False
+                        break
+                definition = " ".join([w.word for w in window_words])
+                if is_definition:
+                    acronym = dict()
+                    acronym["acronym"] = word.word
+                    acronym["definition"] = definition
+                    acronyms.append(acronym)
+                    break
+                start_idx += 1
+    return acronyms
+
+
+# Return a random word starting with 'initial' (a random letter if None)
+def make_word(initial, rand):
+    if initial is None:
+        initial = rand.choice("abcdefghijklmnopqrstuvwxyz")
+    return initial + "".join(rand.choice("aeiounrst")
+                             for i in range(rand.randint(2, 8)))
+
+
+# Create a synthetic sentence of random words, with a gene symbol in
+# parentheses every few words, preceded by its definition half of the times
+def make_sentence(doc_id, sent_id, symbols, rand):
+    length = rand.randint(60, 150)
+    words = ["The"]
+    while len(words) < length:
+        for i in range(rand.randint(2, 10)):
+            words.append(make_word(None, rand))
+        symbol = rand.choice(symbols)
+        if rand.random() < 0.5:
+            for letter in symbol:
+                words.append(make_word(rand.choice(
+                    [letter, letter.lower()]), rand))
+        words += [rand.choice(["(", "["]), symbol, rand.choice([")", "]"])]
+    words.append(".")
+    return Sentence(doc_id, sent_id, list(range(len(words))), words, None,
+                    None, None, None, None, None)
+
+
+# Run 'extract' on all the sentences, and return the acronyms found and the
+# number of seconds it took
+def run(extract, sentences):
+    acronyms = []
+    start_time = time.perf_counter()
+    for sentence in sentences:
+        acronyms.extend(extract(sentence))
+    return (acronyms, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    num_sentences = 2000
+    if len(sys.argv) > 1:
+        num_sentences = int(sys.argv[1])
+    rand = random.Random(0)
+    # The gene symbols that can be acronyms
+    symbols = sorted(
+        symbol for symbol in merged_genes_dict
+        if symbol.isupper() and symbol.isalpha() and len(symbol) >= 2 and
+        symbol not in inverted_long_names)
+    sentences = [make_sentence("DOC{}".format(i // 10), i % 10, symbols, rand)
+                 for i in range(num_sentences)]
+    # Create the Word objects of the sentences in advance
+    for sentence in sentences:
+        sentence.words
+    before, before_time = run(extract_before, sentences)
+    after, after_time = run(extract, sentences)
+    if before != after:
+        sys.stderr.write("The two implementations return different acronyms\n")
+        sys.exit(1)
+    print("{} sentences, {} acronyms".format(len(sentences), len(after)))
+    print("{:<24}{:>12}{:>12}".format("", "before", "after"))
+    print("{:<24}{:>12.0f}{:>12.0f}".format(
+        "sentences per second", len(sentences) / before_time,
+        len(sentences) / after_time))
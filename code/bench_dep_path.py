@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+#
+# Check and measure Sentence.dep_path() on a synthetic corpus
+#
+# USAGE: bench_dep_path.py [NUM_SENTENCES]
+#
+# For random pairs of entities in random sentences, check that dep_path()
+# returns the path with the fewest edges between the two entities (the first
+# one, in case of ties), and compare its speed with the original
+# implementation, which built the paths between all the pairs of words of the
+# two entities and did not actually keep the shortest.
+
+import random
+import sys
+import time
+
+from dstruct.Mention import Mention
+from dstruct.Sentence import Sentence
+
+
+# Create a synthetic sentence with a random dependency tree (or forest)
+def make_sentence(doc_id, sent_id, rand):
+    length = rand.randint(10, 60)
+    words = ["w{}".format(rand.randint(0, 5000)) for i in range(length)]
+    order = list(range(length))
+    rand.shuffle(order)
+    dep_parents = [-1] * length
+    for i in range(1, length):
+        if rand.random() > 0.05:
+            dep_parents[order[i]] = order[rand.randint(0, i - 1)]
+    return Sentence(
+        doc_id, sent_id, list(range(length)), words, ["NN"] * length,
+        [rand.choice(["O", "O", "PERSON"]) for i in range(length)],
+        [word.lower() for word in words],
+        [rand.choice(["nsubj", "dobj", "prep_of", "nn"])
+         for i in range(length)], dep_parents, ["empty"] * length)
+
+
+# Create two random entities of at most 4 words in the sentence
+def make_entities(sentence, rand):
+    entities = []
+    for i in range(2):
+        start = rand.randint(0, len(sentence.words) - 1)
+        end = min(len(sentence.words), start + rand.randint(1, 4))
+        entities.append(Mention("ENTITY", "E", sentence.words[start:end]))
+    return entities
+
+
+# The original implementation of Sentence.dep_path()
+def dep_path_before(sentence, entity1, entity2):
+    paths = []
+    for word1 in entity1.words:
+        for word2 in entity2.words:
+            paths.append(sentence.get_word_dep_path(word1.in_sent_idx,
+                                                    word2.in_sent_idx))
+    path = ""
+    ll = 100000000
+    for p in paths:
+        if len(p) < ll:
+            path = p
+        ll = len(p)
+    return path
+
+
+# Return the number of edges on the dependency path between idx1 and idx2
+def get_distance(sentence, idx1, idx2):
+    path1 = sentence.get_path_till_root(idx1)
+    path2 = sentence.get_path_till_root(idx2)
+    if path1[-1] != path2[-1]:
+        # Different trees, connected through their roots
+        return len(path1) + len(path2)
+    ancestor = sentence.get_common_ancestor(path1, path2)
+    return path1.index(ancestor) + path2.index(ancestor)
+
+
+# Return the path that dep_path() must return
+def expected_dep_path(sentence, entity1, entity2):
+    pairs = [(word1.in_sent_idx, word2.in_sent_idx) for word1 in entity1.words
+             for word2 in entity2.words]
+    closest = min(pairs, key=lambda pair: get_distance(sentence, *pair))
+    return sentence.get_word_dep_path(*closest)
+
+
+# Run 'dep_path' on all the pairs of entities and return the paths and the
+# number of seconds it took
+def run(dep_path, cases):
+    paths = []
+    start_time = time.perf_counter()
+    for sentence, entity1, entity2 in cases:
+        paths.append(dep_path(sentence, entity1, entity2))
+    return (paths, time.perf_counter() - start_time)
+
+
+# Return the cases (sentences and pairs of entities), built from scratch so
+# that the caches of the paths are empty. The dependency trees are
+# preprocessed in advance, as the other features of the extractors need them
+# anyway.
+def make_cases(num_sentences):
+    rand = random.Random(0)
+    cases = []
+    for i in range(num_sentences):
+        sentence = make_sentence("DOC{}".format(i // 10), i % 10, rand)
+        sentence.get_word_dep_lca(0, 0)
+        for j in range(10):
+            cases.append([sentence] + make_entities(sentence, rand))
+    return cases
+
+
+if __name__ == "__main__":
+    num_sentences = 2000
+    if len(sys.argv) > 1:
+        num_sentences = int(sys.argv[1])
+    before, before_time = run(dep_path_before, make_cases(num_sentences))
+    after, after_time = run(Sentence.dep_path, make_cases(num_sentences))
+    expected = run(expected_dep_path, make_cases(num_sentences))[0]
+    wrong = sum(1 for path, expected_path in zip(after, expected)
+                if path != expected_path)
+    if wrong:
+        sys.stderr.write("dep_path() is wrong for {} pairs\n".format(wrong))
+        sys.exit(1)
+    changed = sum(1 for path, path_before in zip(after, before)
+                  if path != path_before)
+    print("{} pairs of entities, {} paths differ from before".format(
+        len(after), changed))
+    print("{:<24}{:>12}{:>12}".format("", "before", "after"))
+    print("{:<24}{:>12.0f}{:>12.0f}".format(
+        "pairs per second", len(before) / before_time,
+        len(after) / after_time))
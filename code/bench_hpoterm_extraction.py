@@ -0,0 +1,177 @@
+#! /usr/bin/env python3
+#
+# Measure the speed of the extraction of the HPO term mentions
+#
+# USAGE: bench_hpoterm_extraction.py SENTENCES_TSV
+#
+# Compare extract_hpoterm_mentions.extract(), which looks up gene long names
+# and HPO terms in a single scan of the phrases of the sentence, with the
+# original implementation, which stemmed every word with the Snowball stemmer,
+# scanned the phrases twice, looked up the set of stems of every phrase in the
+# HPO terms dictionary, checked the used words with a set and deduplicated the
+# mentions with their ids. Both must return the same mentions.
+
+import re
+import sys
+import time
+
+from dstruct.Mention import Mention
+from dstruct.Sentence import Sentence
+from extract_hpoterm_mentions import NEG_PROB, add_features, english_dict, \
+    extract, genes_with_hpoterm, get_negatives_random, hponames_to_ids, \
+    hpoterms_dict, max_mention_length, stopwords_dict
+from helper.easierlife import get_all_phrases_in_sentence
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder
+from nltk.stem.snowball import SnowballStemmer
+
+# The stemmer used before the stem table
+snowball_stemmer = SnowballStemmer("english")
+
+
+# The implementation of extract_hpoterm_mentions.extract() before the stem
+# table, the stem index of the HPO terms, and the single scan of the phrases.
+# Since the words are views on the columns of the sentence, the stems are
+# stored in sentence.stems, and the random negatives and the names of the HPO
+# terms with the same stems are chosen as in the current implementation.
+def extract_two_pass(sentence):
+    mentions = []
+    mention_ids = set()
+    # If there are no English words in the sentence, we skip it.
+    no_english_words = True
+    sentence.stems = []
+    for word in sentence.words:
+        # Here so all words have stem
+        sentence.stems.append(snowball_stemmer.stem(word.word))
+        if len(word.word) > 2 and \
+                (word.word in english_dict or
+                 word.word.casefold() in english_dict):
+            no_english_words = False
+    if no_english_words:
+        return mentions
+    history = set()
+    # Iterate over each phrase of length at most max_mention_length
+    for start, end in get_all_phrases_in_sentence(sentence,
+                                                  max_mention_length):
+        if start in history or end - 1 in history:
+            continue
+        phrase = " ".join([word.word for word in sentence.words[start:end]])
+        # If the phrase is a gene long name containing a phenotype name, create
+        # a candidate that we supervise as negative
+        if len(phrase) > 1 and phrase in genes_with_hpoterm:
+            mention = Mention("HPOTERM_SUP_GENEL",
+                              phrase,
+                              sentence.words[start:end])
+            mention.is_correct = False
+            add_features(mention, sentence)
+            mentions.append(mention)
+            for word in sentence.words[start:end]:
+                history.add(word.in_sent_idx)
+            continue
+    # Iterate over each phrase of length at most max_mention_length
+    for start, end in get_all_phrases_in_sentence(sentence,
+                                                  max_mention_length):
+        should_continue = False
+        for i in range(start, end):
+            if i in history:
+                should_continue = True
+                break
+        if should_continue:
+            continue
+        # The list of stems in the phrase (not from stopwords or symbols, and
+        # not already used for a mention)
+        phrase_stems = []
+        for word in sentence.words[start:end]:
+            if not re.match(r"^(_|\W)+$", word.word) and \
+                    (len(word.word) == 1 or
+                     word.lemma.casefold() not in stopwords_dict):
+                phrase_stems.append(word.stem)
+        phrase_stems_set = frozenset(phrase_stems)
+        if phrase_stems_set in hpoterms_dict:
+            # Find the word objects of that match
+            mention_words = []
+            mention_lemmas = []
+            mention_stems = []
+            for word in sentence.words[start:end]:
+                if word.stem in phrase_stems_set and \
+                        word.lemma.casefold() not in mention_lemmas and \
+                        word.stem not in mention_stems:
+                    mention_lemmas.append(word.lemma.casefold())
+                    mention_words.append(word)
+                    mention_stems.append(word.stem)
+                    if len(mention_words) == len(phrase_stems_set):
+                        break
+            entity = min(hpoterms_dict[phrase_stems_set])
+            mention = Mention(
+                "HPOTERM", hponames_to_ids[entity] + "|" + entity,
+                mention_words)
+            # The following is a way to avoid duplicates.
+            # It's ugly and not perfect
+            if mention.id() in mention_ids:
+                continue
+            mention_ids.add(mention.id())
+            # Features
+            add_features(mention, sentence)
+            mentions.append(mention)
+            for word in mention_words:
+                history.add(word.in_sent_idx)
+    # Generate some negative candidates at random, if this sentences didn't
+    # contain any other candidate. We want the candidates to be nouns.
+    if len(mentions) > 0:
+        return mentions
+    rand = get_negatives_random(sentence.doc_id, sentence.sent_id)
+    if rand.random() <= NEG_PROB:
+        index = rand.randint(0, len(sentence.words) - 1)
+        # We may not get a noun at random, so we try again if we don't.
+        tries = 10
+        while not sentence.words[index].pos.startswith("NN") and tries > 0:
+            index = rand.randint(0, len(sentence.words) - 1)
+            tries -= 1
+        if sentence.words[index].pos.startswith("NN"):
+            mention = Mention(
+                "HPOTERM_SUP_rand", sentence.words[index].lemma.casefold(),
+                sentence.words[index:index+1])
+            mention.is_correct = False
+            add_features(mention, sentence)
+            mentions.append(mention)
+    return mentions
+
+
+# Run 'extract' on all the sentences, and return the dumps of the mentions and
+# the number of seconds it took
+def run(extract, sentences):
+    dumps = []
+    start_time = time.perf_counter()
+    for sentence in sentences:
+        for mention in extract(sentence):
+            dumps.append(mention.tsv_dump())
+    return (dumps, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.stderr.write("USAGE: {} SENTENCES_TSV\n".format(sys.argv[0]))
+        sys.exit(1)
+    decoder = TSVDecoder(SENTENCE_COLUMNS, used=[
+        "doc_id", "sent_id", "wordidxs", "words", "poses", "ners", "lemmas",
+        "dep_paths", "dep_parents"])
+    sentences = []
+    with open(sys.argv[1], 'rt') as input_file:
+        for row in decoder.decode_lines(input_file):
+            sentence = Sentence(
+                row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+                row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+                row.bounding_boxes)
+            if not sentence.is_weird():
+                sentences.append(sentence)
+    # Warm up the caches of the stemmer and of the sentences
+    run(extract, sentences)
+    before, before_time = run(extract_two_pass, sentences)
+    after, after_time = run(extract, sentences)
+    if before != after:
+        sys.stderr.write("The two implementations return different mentions\n")
+        sys.exit(1)
+    print("{} sentences, {} mentions".format(len(sentences), len(after)))
+    print("{:<24}{:>12}{:>12}".format("", "before", "after"))
+    print("{:<24}{:>12.0f}{:>12.0f}".format(
+        "sentences per second", len(sentences) / before_time,
+        len(sentences) / after_time))
@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+#
+# Measure the memory used by Mention and Relation objects on a synthetic corpus
+#
+# USAGE: bench_mention_memory.py [NUM_SENTENCES]
+#
+# Compare the slotted Mention and Relation classes with equivalent classes
+# storing their attributes in a per-instance __dict__ (as they used to). Only
+# the memory allocated while creating the mentions and relations is counted,
+# not the sentences.
+
+import random
+import sys
+import tracemalloc
+
+from dstruct.Mention import Mention
+from dstruct.Relation import Relation
+from dstruct.Sentence import Sentence
+
+
+# Return a copy of the slotted class 'cls' storing its attributes in a
+# per-instance __dict__
+def unslotted(cls):
+    attrs = dict()
+    for name, value in vars(cls).items():
+        if name not in cls.__slots__ and \
+                name not in ("__slots__", "__dict__", "__weakref__"):
+            attrs[name] = value
+    return type("Unslotted" + cls.__name__, (object,), attrs)
+
+
+# Create a synthetic sentence with random words
+def make_sentence(doc_id, sent_id, rand):
+    length = rand.randint(10, 60)
+    words = ["w{}".format(rand.randint(0, 5000)) for i in range(length)]
+    return Sentence(
+        doc_id, sent_id, list(range(length)), words,
+        [rand.choice(["NN", "VBZ", "JJ", "IN"]) for i in range(length)],
+        ["O"] * length, [word.lower() for word in words],
+        [rand.choice(["nsubj", "dobj", "prep_of"]) for i in range(length)],
+        [i - 1 for i in range(length)], ["empty"] * length)
+
+
+# Create a few mentions and relations per sentence, with 'num_features'
+# features each, and return the number of bytes allocated per mention and per
+# relation
+def measure(sentences, mention_cls, relation_cls, num_features, rand):
+    tracemalloc.start()
+    mentions = []
+    for sentence in sentences:
+        for i in range(rand.randint(1, 4)):
+            start = rand.randint(0, len(sentence.words) - 3)
+            end = start + rand.randint(1, 3)
+            mention = mention_cls("GENE", "ENTITY{}".format(i),
+                                  sentence.words[start:end])
+            for j in range(num_features):
+                mention.add_feature("FEATURE_{}".format(j))
+            mentions.append(mention)
+    mentions_bytes = tracemalloc.get_traced_memory()[0]
+    relations = []
+    for i in range(0, len(mentions) - 1, 2):
+        relation = relation_cls("GENEHPOTERM", mentions[i], mentions[i + 1])
+        for j in range(num_features):
+            relation.add_feature("FEATURE_{}".format(j))
+        relations.append(relation)
+    relations_bytes = tracemalloc.get_traced_memory()[0] - mentions_bytes
+    tracemalloc.stop()
+    return (mentions_bytes / len(mentions), relations_bytes / len(relations))
+
+
+if __name__ == "__main__":
+    num_sentences = 10000
+    if len(sys.argv) > 1:
+        num_sentences = int(sys.argv[1])
+    rand = random.Random(0)
+    sentences = [make_sentence("DOC{}".format(i // 10), i % 10, rand)
+                 for i in range(num_sentences)]
+    # Create the Word objects of the sentences in advance
+    for sentence in sentences:
+        sentence.words
+    print("{:<24}{:>12}{:>12}".format("bytes per object", "before", "after"))
+    for num_features in [0, 10]:
+        before = measure(sentences, unslotted(Mention), unslotted(Relation),
+                         num_features, random.Random(1))
+        after = measure(sentences, Mention, Relation, num_features,
+                        random.Random(1))
+        for i, name in enumerate(["mention", "relation"]):
+            print("{:<24}{:>12.1f}{:>12.1f}".format(
+                "{} ({} features)".format(name, num_features), before[i],
+                after[i]))
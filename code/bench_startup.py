@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+#
+# Measure the time from the start of an extractor to its first processed
+# sentence
+#
+# USAGE: bench_startup.py SENTENCES_TSV [EXTRACTOR...]
+#
+# Start each extractor (default: extract_gene_mentions.py and
+# extract_hpoterm_mentions.py) in a new process, which loads the dictionaries,
+# decodes the first sentence of SENTENCES_TSV, and processes it. The time is
+# measured cold (the dictionaries are parsed and their snapshots built), warm
+# (the dictionaries are loaded from the snapshots), and warm with
+# SHARED_DICTS=1 (the dictionaries are memory-mapped), with a temporary
+# directory of snapshots. The time to exit, freeing the dictionaries, is not
+# included.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CODE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# The code run in the new process: import the extractor (given as module
+# name), process the first sentence of the input, and tell the parent
+CHILD_CODE = """
+import os
+import sys
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder
+extractor = __import__(sys.argv[1])
+with open(sys.argv[2], 'rt') as input_file:
+    line = input_file.readline()
+for row in TSVDecoder(SENTENCE_COLUMNS).decode_lines([line]):
+    extractor.process(row)
+sys.stdout.write("done\\n")
+sys.stdout.flush()
+os._exit(0)
+"""
+
+# Number of runs of each warm measurement (the minimum is reported)
+NUM_RUNS = 3
+
+
+# Start the extractor and return the number of seconds until its first
+# sentence is processed
+def time_startup(extractor, input_filename, env):
+    start_time = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", CHILD_CODE, extractor[:-3], input_filename],
+        cwd=CODE_DIR, env=env, stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL)
+    line = child.stdout.readline()
+    elapsed = time.perf_counter() - start_time
+    child.wait()
+    if line != b"done\n":
+        sys.stderr.write("{} failed\n".format(extractor))
+        sys.exit(1)
+    return elapsed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("USAGE: {} SENTENCES_TSV [EXTRACTOR...]\n".format(
+            sys.argv[0]))
+        sys.exit(1)
+    input_filename = os.path.realpath(sys.argv[1])
+    extractors = sys.argv[2:]
+    if not extractors:
+        extractors = ["extract_gene_mentions.py",
+                      "extract_hpoterm_mentions.py"]
+    print("{:<32}{:>10}{:>10}{:>10}".format(
+        "seconds to first sentence", "cold", "warm", "shared"))
+    for extractor in extractors:
+        with tempfile.TemporaryDirectory() as snapshots_dir:
+            env = dict(os.environ, DICTS_SNAPSHOTS_DIR=snapshots_dir,
+                       SHARED_DICTS="0")
+            cold = time_startup(extractor, input_filename, env)
+            warm = min(time_startup(extractor, input_filename, env)
+                       for i in range(NUM_RUNS))
+            env["SHARED_DICTS"] = "1"
+            # Build the memory-mapped dictionaries
+            time_startup(extractor, input_filename, env)
+            shared = min(time_startup(extractor, input_filename, env)
+                         for i in range(NUM_RUNS))
+        print("{:<32}{:>10.3f}{:>10.3f}{:>10.3f}".format(
+            extractor, cold, warm, shared))
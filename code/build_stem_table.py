@@ -0,0 +1,47 @@
+#! /usr/bin/env python3
+#
+# Precompute the stems of the vocabulary, so that the extractors do not need to
+# run the stemmer (nor import NLTK) for each token (see helper/stemmer.py)
+#
+# USAGE: build_stem_table.py [SENTENCES_TSV ...] > ../dicts/stems.tsv
+#
+# The vocabulary contains the English words, the words of the HPO names, and
+# the words of the sentences in the given files (in the format of the input of
+# the extractors, see helper.tsv.SENTENCE_COLUMNS).
+# The output is a TSV file where the first column is a token and the second is
+# its stem, or is empty if the stem is the token itself.
+
+import fileinput
+import sys
+
+from nltk.stem.snowball import SnowballStemmer
+
+from helper.dictionaries import ENGLISH_DICT_FILENAME, \
+    HPOTERMS_DICT_FILENAME, HPOTERMS_ORIG_DICT_FILENAME
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder
+
+
+def main():
+    vocabulary = set()
+    with open(ENGLISH_DICT_FILENAME, 'rt') as english_file:
+        for line in english_file:
+            vocabulary.add(line.rstrip())
+    for filename in [HPOTERMS_ORIG_DICT_FILENAME, HPOTERMS_DICT_FILENAME]:
+        with open(filename, 'rt') as hpoterms_file:
+            for line in hpoterms_file:
+                vocabulary.update(line.split("\t")[1].split())
+    if len(sys.argv) > 1:
+        decoder = TSVDecoder(SENTENCE_COLUMNS, ["words"])
+        with fileinput.input() as input_files:
+            for row in decoder.decode_lines(input_files):
+                if row.words is not None:
+                    vocabulary.update(row.words)
+    vocabulary.discard("")
+    stemmer = SnowballStemmer("english")
+    for token in sorted(vocabulary):
+        stem = stemmer.stem(token)
+        print("{}\t{}".format(token, stem if stem != token else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,7 @@ if len(sys.argv) != 2:
     sys.stderr.write("USAGE: {} dump.tsv\n".format(sys.argv[0]))
     sys.exit(1)
 
-hpoancestors = load_dict("hpoancestors")
+hpodag = load_dict("hpodag")
 
 with open(sys.argv[1], 'rt') as dump:
     for line in dump:
@@ -24,5 +24,5 @@ with open(sys.argv[1], 'rt') as dump:
             continue
         hpo_id = hpo_entity.split("|")[0]
         print("{}\t{}".format(gene_entity, hpo_entity))
-        for ancestor in hpoancestors[hpo_id]:
+        for ancestor in hpodag.ancestors(hpo_id):
             print("{}\t{}".format(gene_entity, ancestor))
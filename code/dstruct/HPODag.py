@@ -0,0 +1,165 @@
+#! /usr/bin/env python3
+""" The HPO DAG
+
+HPO IDs are mapped to dense integers, and the parent and child relations are
+stored in compressed (CSR) adjacency arrays. The transitive closures of the
+relations (ancestors and descendants of each term) are computed once, in
+topological order, and stored as bitsets (Python ints, where bit i is set if
+the term with integer id i belongs to the set), so that ancestor queries do not
+need to walk the DAG.
+"""
+
+from array import array
+from collections import deque
+
+
+class HPODag(object):
+
+    ROOT = "HP:0000001"  # 'All'
+
+    # Build the DAG from a file in the format of dicts/hpo_dag.tsv: each line
+    # is 'child<TAB>is_a<TAB>parent'
+    def __init__(self, filename):
+        edges = []
+        self.ids = []
+        self.id_to_idx = dict()
+        with open(filename, 'rt') as dag_file:
+            for line in dag_file:
+                child, is_a, parent = line.strip().split("\t")
+                edges.append((self._add_id(child), self._add_id(parent)))
+        edges = sorted(set(edges))
+        self.parents_ptr, self.parents_idx = self._build_csr(edges)
+        self.children_ptr, self.children_idx = self._build_csr(
+            sorted((parent, child) for child, parent in edges))
+        self._compute_closures()
+        self._compute_depths()
+
+    def _add_id(self, hpo_id):
+        idx = self.id_to_idx.get(hpo_id)
+        if idx is None:
+            idx = len(self.ids)
+            self.id_to_idx[hpo_id] = idx
+            self.ids.append(hpo_id)
+        return idx
+
+    # Build the CSR representation of the sorted list of (source, target)
+    # pairs: the targets of 'source' are idx[ptr[source]:ptr[source + 1]].
+    def _build_csr(self, pairs):
+        ptr = array('i', [0] * (len(self.ids) + 1))
+        idx = array('i', [target for source, target in pairs])
+        for source, target in pairs:
+            ptr[source + 1] += 1
+        for i in range(len(self.ids)):
+            ptr[i + 1] += ptr[i]
+        return (ptr, idx)
+
+    def _parents_of(self, idx):
+        ptr = self.parents_ptr
+        return self.parents_idx[ptr[idx]:ptr[idx + 1]]
+
+    def _children_of(self, idx):
+        return self.children_idx[
+            self.children_ptr[idx]:self.children_ptr[idx + 1]]
+
+    # Compute the ancestors and descendants bitsets, visiting the terms in
+    # topological order (parents before children).
+    def _compute_closures(self):
+        num_parents = [self.parents_ptr[i + 1] - self.parents_ptr[i]
+                       for i in range(len(self.ids))]
+        queue = deque(i for i in range(len(self.ids)) if num_parents[i] == 0)
+        order = []
+        while queue:
+            idx = queue.popleft()
+            order.append(idx)
+            for child in self._children_of(idx):
+                num_parents[child] -= 1
+                if num_parents[child] == 0:
+                    queue.append(child)
+        if len(order) != len(self.ids):
+            raise ValueError("The HPO DAG contains a cycle")
+        self.ancestors_bits = [0] * len(self.ids)
+        for idx in order:
+            bits = 0
+            for parent in self._parents_of(idx):
+                bits |= self.ancestors_bits[parent] | (1 << parent)
+            self.ancestors_bits[idx] = bits
+        self.descendants_bits = [0] * len(self.ids)
+        for idx in reversed(order):
+            bits = 0
+            for child in self._children_of(idx):
+                bits |= self.descendants_bits[child] | (1 << child)
+            self.descendants_bits[idx] = bits
+
+    # Compute the depth of each term, i.e., the length of the shortest path
+    # from a root of the DAG to the term.
+    def _compute_depths(self):
+        self.depths = array('i', [-1] * len(self.ids))
+        queue = deque()
+        for idx in range(len(self.ids)):
+            if self.parents_ptr[idx] == self.parents_ptr[idx + 1]:
+                self.depths[idx] = 0
+                queue.append(idx)
+        while queue:
+            idx = queue.popleft()
+            for child in self._children_of(idx):
+                if self.depths[child] == -1:
+                    self.depths[child] = self.depths[idx] + 1
+                    queue.append(child)
+
+    # Return the set of HPO IDs whose integer ids are the bits set in 'bits'
+    def _bits_to_ids(self, bits):
+        ids = set()
+        while bits:
+            lowest = bits & -bits
+            ids.add(self.ids[lowest.bit_length() - 1])
+            bits ^= lowest
+        return ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, hpo_id):
+        return hpo_id in self.id_to_idx
+
+    def parents(self, hpo_id):
+        return set(self.ids[i]
+                   for i in self._parents_of(self.id_to_idx[hpo_id]))
+
+    def children(self, hpo_id):
+        return set(self.ids[i]
+                   for i in self._children_of(self.id_to_idx[hpo_id]))
+
+    # Return the set of ancestors of the term (the term itself excluded)
+    def ancestors(self, hpo_id):
+        return self._bits_to_ids(self.ancestors_bits[self.id_to_idx[hpo_id]])
+
+    # Return the set of descendants of the term (the term itself excluded)
+    def descendants(self, hpo_id):
+        return self._bits_to_ids(
+            self.descendants_bits[self.id_to_idx[hpo_id]])
+
+    # Return True if 'ancestor' is an ancestor of 'hpo_id'
+    def is_ancestor(self, ancestor, hpo_id):
+        return (self.ancestors_bits[self.id_to_idx[hpo_id]] >>
+                self.id_to_idx[ancestor]) & 1 == 1
+
+    # Return the length of the shortest path from the root to the term
+    def depth(self, hpo_id):
+        return self.depths[self.id_to_idx[hpo_id]]
+
+    # Return the set of lowest common ancestors of the two terms, i.e., the
+    # common ancestors (including the terms themselves) that are not ancestors
+    # of another common ancestor. In a DAG there can be more than one.
+    def lowest_common_ancestors(self, hpo_id_1, hpo_id_2):
+        idx_1 = self.id_to_idx[hpo_id_1]
+        idx_2 = self.id_to_idx[hpo_id_2]
+        common = (self.ancestors_bits[idx_1] | (1 << idx_1)) & \
+            (self.ancestors_bits[idx_2] | (1 << idx_2))
+        lowest = 0
+        bits = common
+        while bits:
+            bit = bits & -bits
+            bits ^= bit
+            if self.descendants_bits[bit.bit_length() - 1] & common == 0:
+                lowest |= bit
+        return self._bits_to_ids(lowest)
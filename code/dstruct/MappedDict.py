@@ -0,0 +1,227 @@
+#! /usr/bin/env python3
+""" A read-only dictionary (or set) stored in a memory-mapped file
+
+The file is an open-addressing hash table: all the processes mapping the same
+file share a single copy of it in the page cache, and nothing is unpickled into
+per-process objects. Keys must be strings. Values can be strings, lists of
+strings, or sets of strings (returned as frozensets). A set is stored as a
+dictionary without values.
+
+File layout (all integers are little-endian):
+- header: magic, kind of values, number of keys, number of slots, offset of
+  the slots, and the key identifying the source of the dictionary (see
+  helper.dictionaries.get_snapshot_key());
+- slots: one unsigned 64-bit offset of an entry per slot, 0 if empty;
+- entries: the length of the key, the UTF-8 encoded key, then the value: the
+  length of the string and the string, or the number of strings followed by the
+  length and the bytes of each string.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+
+class MappedDict(object):
+
+    MAGIC = b"DDGMAPD1"
+    # Kinds of values
+    KIND_NONE = 0  # a set
+    KIND_STR = 1
+    KIND_LIST = 2
+    KIND_SET = 3
+
+    _HEADER = struct.Struct("<8sIQQQ40s")
+    _UINT32 = struct.Struct("<I")
+
+    def __init__(self, filename, source_key=None):
+        with open(filename, 'rb') as mapped_file:
+            self._mm = mmap.mmap(mapped_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        magic, self.kind, self._size, self._nslots, slots_offset, key = \
+            self._HEADER.unpack_from(self._mm, 0)
+        if magic != self.MAGIC:
+            raise ValueError("Not a mapped dictionary: {}".format(filename))
+        self.source_key = key.decode("ascii")
+        if source_key is not None and self.source_key != source_key:
+            raise ValueError("Stale mapped dictionary: {}".format(filename))
+        self._mask = self._nslots - 1
+        self._entries_offset = slots_offset + 8 * self._nslots
+        self._slots = memoryview(self._mm)[
+            slots_offset:self._entries_offset].cast("Q")
+
+    # Return the kind of the values in obj, or raise TypeError if obj cannot be
+    # stored in a mapped dictionary
+    @classmethod
+    def get_kind(cls, obj):
+        if isinstance(obj, (set, frozenset)):
+            if all(isinstance(key, str) for key in obj):
+                return cls.KIND_NONE
+        elif isinstance(obj, dict) and \
+                all(isinstance(key, str) for key in obj):
+            values = obj.values()
+            if all(isinstance(value, str) for value in values):
+                return cls.KIND_STR
+            if all(isinstance(value, list) and
+                   all(isinstance(x, str) for x in value)
+                   for value in values):
+                return cls.KIND_LIST
+            if all(isinstance(value, (set, frozenset)) and
+                   all(isinstance(x, str) for x in value)
+                   for value in values):
+                return cls.KIND_SET
+        raise TypeError("Cannot map a {}".format(type(obj).__name__))
+
+    # Write obj to filename as a mapped dictionary. The file is written to a
+    # temporary file and then renamed, so that processes opening it at the same
+    # time never see a partially written file.
+    @classmethod
+    def build(cls, filename, obj, source_key=""):
+        kind = cls.get_kind(obj)
+        nslots = 8
+        while nslots < 2 * len(obj):
+            nslots *= 2
+        # Align the slots to 8 bytes
+        slots_offset = (cls._HEADER.size + 7) // 8 * 8
+        offset = slots_offset + 8 * nslots
+        slots = [0] * nslots
+        mask = nslots - 1
+        entries = []
+        for key in obj:
+            key_bytes = key.encode("utf-8", "surrogatepass")
+            slot = zlib.crc32(key_bytes) & mask
+            while slots[slot] != 0:
+                slot = (slot + 1) & mask
+            slots[slot] = offset
+            entry = [cls._UINT32.pack(len(key_bytes)), key_bytes]
+            if kind == cls.KIND_STR:
+                value_bytes = obj[key].encode("utf-8", "surrogatepass")
+                entry += [cls._UINT32.pack(len(value_bytes)), value_bytes]
+            elif kind != cls.KIND_NONE:
+                value = obj[key]
+                if kind == cls.KIND_SET:
+                    value = sorted(value)
+                entry.append(cls._UINT32.pack(len(value)))
+                for x in value:
+                    x_bytes = x.encode("utf-8", "surrogatepass")
+                    entry += [cls._UINT32.pack(len(x_bytes)), x_bytes]
+            entry = b"".join(entry)
+            entries.append(entry)
+            offset += len(entry)
+        header = cls._HEADER.pack(cls.MAGIC, kind, len(obj), nslots,
+                                  slots_offset, source_key.encode("ascii"))
+        dirname = os.path.dirname(filename)
+        fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(header)
+                tmp_file.write(b"\0" * (slots_offset - len(header)))
+                tmp_file.write(struct.pack("<{}Q".format(nslots), *slots))
+                for entry in entries:
+                    tmp_file.write(entry)
+            os.chmod(tmp_filename, 0o644)
+            os.replace(tmp_filename, filename)
+        except:
+            os.remove(tmp_filename)
+            raise
+
+    # Return the offset of the value for key, or -1 if key is not present
+    def _find(self, key):
+        try:
+            key_bytes = key.encode("utf-8", "surrogatepass")
+        except AttributeError:
+            # Not a string, so it cannot be a key
+            return -1
+        mm = self._mm
+        slots = self._slots
+        mask = self._mask
+        key_len = len(key_bytes)
+        slot = zlib.crc32(key_bytes) & mask
+        while True:
+            offset = slots[slot]
+            if offset == 0:
+                return -1
+            if self._UINT32.unpack_from(mm, offset)[0] == key_len and \
+                    mm[offset + 4:offset + 4 + key_len] == key_bytes:
+                return offset + 4 + key_len
+            slot = (slot + 1) & mask
+
+    # Return the string starting at offset, and the offset following it
+    def _read_str(self, offset):
+        length = self._UINT32.unpack_from(self._mm, offset)[0]
+        offset += 4
+        end = offset + length
+        return (self._mm[offset:end].decode("utf-8", "surrogatepass"), end)
+
+    # Return the value starting at offset, and the offset following it
+    def _read_value(self, offset):
+        if self.kind == self.KIND_NONE:
+            return (None, offset)
+        if self.kind == self.KIND_STR:
+            return self._read_str(offset)
+        count = self._UINT32.unpack_from(self._mm, offset)[0]
+        offset += 4
+        value = []
+        for i in range(count):
+            x, offset = self._read_str(offset)
+            value.append(x)
+        if self.kind == self.KIND_SET:
+            value = frozenset(value)
+        return (value, offset)
+
+    # Return the offset following the value starting at offset
+    def _skip_value(self, offset):
+        if self.kind == self.KIND_NONE:
+            return offset
+        unpack_from = self._UINT32.unpack_from
+        if self.kind == self.KIND_STR:
+            return offset + 4 + unpack_from(self._mm, offset)[0]
+        count = unpack_from(self._mm, offset)[0]
+        offset += 4
+        for i in range(count):
+            offset += 4 + unpack_from(self._mm, offset)[0]
+        return offset
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return self._find(key) != -1
+
+    def __getitem__(self, key):
+        offset = self._find(key)
+        if offset == -1 or self.kind == self.KIND_NONE:
+            raise KeyError(key)
+        return self._read_value(offset)[0]
+
+    def get(self, key, default=None):
+        offset = self._find(key)
+        if offset == -1 or self.kind == self.KIND_NONE:
+            return default
+        return self._read_value(offset)[0]
+
+    # Iterate over the (key, value) pairs, in the order of the file
+    def items(self):
+        offset = self._entries_offset
+        end = len(self._mm)
+        while offset < end:
+            key, offset = self._read_str(offset)
+            value, offset = self._read_value(offset)
+            yield (key, value)
+
+    def keys(self):
+        offset = self._entries_offset
+        end = len(self._mm)
+        while offset < end:
+            key, offset = self._read_str(offset)
+            offset = self._skip_value(offset)
+            yield key
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+    def __iter__(self):
+        return self.keys()
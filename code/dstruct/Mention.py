@@ -11,16 +11,8 @@ from helper.easierlife import list2TSVarray
 
 class Mention(object):
 
-    doc_id = None
-    sent_id = None
-    wordidxs = None
-    type = None
-    entity = None
-    words = None
-    features = None
-    is_correct = None
-    right_lemma = ""
-    left_lemma = ""
+    __slots__ = ("doc_id", "sent_id", "wordidxs", "type", "entity", "words",
+                 "features", "is_correct", "right_lemma", "left_lemma")
 
     def __init__(self, _type, _entity, _words):
         self.doc_id = _words[0].doc_id
@@ -32,6 +24,8 @@ class Mention(object):
         self.words = _words
         self.features = set()
         self.is_correct = None
+        self.right_lemma = ""
+        self.left_lemma = ""
 
     def __repr__(self):
         return " ".join([w.word for w in self.words])
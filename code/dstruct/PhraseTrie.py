@@ -0,0 +1,124 @@
+#! /usr/bin/env python3
+""" A token-level trie of phrases
+
+Phrases are stored as sequences of tokens (the words of the phrase, split on
+single spaces), so that a sentence can be matched against all the phrases in
+the trie with a single left-to-right scan of its words, instead of joining and
+looking up every subsequence of the sentence.
+"""
+
+
+class PhraseTrie(object):
+
+    # Each node is a list [value, children], where 'children' is a dict from
+    # token to node, or None if the node is a leaf. 'value' is None if no
+    # phrase ends at the node.
+    _VALUE = 0
+    _CHILDREN = 1
+
+    def __init__(self):
+        self.root = dict()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    # Return the tokens of a phrase. We split on single spaces so that
+    # " ".join(tokens) gives back exactly the phrase.
+    @staticmethod
+    def tokenize(phrase):
+        return phrase.split(" ")
+
+    # Return the node for the phrase with the given tokens, creating the
+    # missing nodes on the way.
+    def _get_or_add_node(self, tokens):
+        children = self.root
+        node = None
+        for token in tokens:
+            if children is None:
+                children = dict()
+                node[self._CHILDREN] = children
+            next_node = children.get(token)
+            if next_node is None:
+                next_node = [None, None]
+                children[token] = next_node
+            node = next_node
+            children = node[self._CHILDREN]
+        return node
+
+    # Return the node for the phrase with the given tokens, or None
+    def _get_node(self, tokens):
+        children = self.root
+        node = None
+        for token in tokens:
+            if children is None:
+                return None
+            node = children.get(token)
+            if node is None:
+                return None
+            children = node[self._CHILDREN]
+        return node
+
+    # Associate 'value' to the phrase. If 'merge' is given, it is called with
+    # the current value and the new one, and the result is stored.
+    def add(self, phrase, value, merge=None):
+        tokens = self.tokenize(phrase)
+        node = self._get_or_add_node(tokens)
+        if node[self._VALUE] is None:
+            self.size += 1
+            node[self._VALUE] = value
+        elif merge is not None:
+            node[self._VALUE] = merge(node[self._VALUE], value)
+        else:
+            node[self._VALUE] = value
+
+    # Return the value associated to the phrase, or 'default'
+    def get(self, phrase, default=None):
+        node = self._get_node(self.tokenize(phrase))
+        if node is None or node[self._VALUE] is None:
+            return default
+        return node[self._VALUE]
+
+    def __contains__(self, phrase):
+        return self.get(phrase) is not None
+
+    # Return the set of the first tokens of the phrases (a view on the trie)
+    def first_tokens(self):
+        return self.root.keys()
+
+    # Find the longest phrase starting at tokens[start] and ending before
+    # tokens[end]. Only values for which accept(value) is True (or not None, if
+    # accept is None) are considered. Return the pair (phrase_end, value),
+    # where phrase_end is the index of the token following the phrase, or None
+    # if there is no such phrase.
+    def longest_match(self, tokens, start, end, accept=None):
+        match = None
+        children = self.root
+        idx = start
+        while idx < end and children is not None:
+            node = children.get(tokens[idx])
+            if node is None:
+                break
+            idx += 1
+            value = node[self._VALUE]
+            if value is not None and (accept is None or accept(value)):
+                match = (idx, value)
+            children = node[self._CHILDREN]
+        return match
+
+    # Scan the tokens from left to right and yield the triples (start, end,
+    # value) of the non-overlapping phrases found, preferring the longest
+    # phrase at each position. Phrases are at most 'max_length' tokens long
+    # and end before tokens[stop] (default: the end of the tokens).
+    def find_all(self, tokens, max_length, stop=None, accept=None):
+        if stop is None:
+            stop = len(tokens)
+        start = 0
+        while start < stop:
+            match = self.longest_match(
+                tokens, start, min(stop, start + max_length), accept)
+            if match is None:
+                start += 1
+            else:
+                yield (start, match[0], match[1])
+                start = match[0]
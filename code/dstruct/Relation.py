@@ -9,16 +9,10 @@ from helper.easierlife import list2TSVarray
 
 
 class Relation(object):
-    doc_id = None
-    sent_id_1 = None
-    sent_id_2 = None
-    type = None
-    mention_1_id = None
-    mention_2_id = None
-    mention_1_words = None
-    mention_2_words = None
-    features = None
-    is_correct = None
+
+    __slots__ = ("doc_id", "sent_id_1", "sent_id_2", "type", "mention_1_id",
+                 "mention_2_id", "mention_1_words", "mention_2_words",
+                 "features", "is_correct")
 
     def __init__(self, _type, mention_1, mention_2):
         self.doc_id = mention_1.words[0].doc_id
@@ -30,6 +24,7 @@ class Relation(object):
         self.mention_1_words = mention_1.words
         self.mention_2_words = mention_2.words
         self.features = set()
+        self.is_correct = None
 
     def id(self):
         return "RELATION_{}_{}_{}_{}_{}_{}_{}_{}".format(
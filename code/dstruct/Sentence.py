@@ -1,11 +1,30 @@
 #! /usr/bin/env python3
 """ A Sentence class
 
-Basically a container for an array of Word objects, plus doc_id and sent_id.
+Basically a container for the words of a sentence, plus doc_id and sent_id.
+The attributes of the words are stored as parallel lists (the columns: tokens,
+poses, ners, lemmas, ...), and sentence.words gives the list of Word objects,
+which are views on the columns, created the first time it is accessed.
+sentence.token_attrs gives the attributes of the tokens used by the features
+(see dstruct/TokenAttrs.py), also computed the first time it is accessed.
+
+The dependency tree of the sentence is preprocessed (once, the first time a
+dependency path is requested) into a parent array, the depths of the words,
+and a binary lifting table for lowest common ancestor queries. The dependency
+path features can be cached per pair of words, up to a maximum number of
+features per sentence, if the extractor enables the cache (see
+set_dep_path_cache()). The lengths of the dependency path
+features from a word to all the words of the sentence are computed at once
+from the lengths of the labels, without building the features, and cached: the
+rows of an all-pairs matrix, built lazily and shared by all the mentions and
+relations of the sentence.
 
 Originally obtained from the 'pharm' repository, but modified.
 """
 
+import heapq
+
+from dstruct.TokenAttrs import TokenAttrs
 from dstruct.Word import Word
 
 
@@ -14,27 +33,75 @@ class Sentence(object):
     _MAX_DEP_PATH_LEN = 1000
     doc_id = None
     sent_id = None
-    words = []
+    # The cache of the dependency path features (see set_dep_path_cache()):
+    # maximum number of features cached per sentence (0: disabled), and number
+    # of hits and misses over all the sentences (in a list, as assigning to
+    # class attributes would slow down all attribute lookups)
+    _dep_path_cache_size = 0
+    _dep_path_cache_stats = [0, 0]
 
     def __init__(self, _doc_id, _sent_id, _wordidxs, _words, _poses, _ners,
                  _lemmas, _dep_paths, _dep_parents, _bounding_boxes):
         self.doc_id = _doc_id
         self.sent_id = _sent_id
-        wordidxs = _wordidxs
-        words = _words
-        poses = _poses
-        ners = _ners
-        lemmas = _lemmas
-        dep_paths = _dep_paths
-        dep_parents = _dep_parents
-        bounding_boxes = _bounding_boxes
-        self.words = []
+        # The columns that the caller does not use may be None (see
+        # helper/tsv.py)
         if _wordidxs:  # checking for None
-            for i in range(len(wordidxs)):
-                word = Word(self.doc_id, self.sent_id, wordidxs[i], words[i],
-                            poses[i], ners[i], lemmas[i], dep_paths[i],
-                            dep_parents[i], bounding_boxes[i])
-                self.words.append(word)
+            self.wordidxs = _wordidxs
+            self.tokens = _words
+            self.poses = _poses
+            self.ners = _ners
+            self.lemmas = _lemmas
+            self.dep_paths = _dep_paths
+            self.dep_parents = _dep_parents
+            self.bounding_boxes = _bounding_boxes
+        else:
+            self.wordidxs = []
+            self.tokens = []
+            self.poses = []
+            self.ners = []
+            self.lemmas = []
+            self.dep_paths = []
+            self.dep_parents = []
+            self.bounding_boxes = []
+        # The stems of the words, if computed by the extractor
+        self.stems = None
+        self._words = None
+        self._token_attrs = None
+        # The dependency tree (see _build_dep_tree()): None if not built yet,
+        # False if the tree is malformed
+        self._dep_tree = None
+        self._dep_path_cache = dict() if self._dep_path_cache_size else None
+        self._dep_path_lengths_cache = dict()
+
+    # Enable the cache of the dependency path features of the sentences
+    # created from now on, caching at most 'size' features per sentence, or
+    # disable it if 'size' is 0. The same features are requested over and over
+    # by the feature functions of the extractors, for each mention candidate.
+    @classmethod
+    def set_dep_path_cache(cls, size):
+        cls._dep_path_cache_size = size
+
+    # Return the (hits, misses, size) statistics of the cache of the dependency
+    # path features
+    @classmethod
+    def dep_path_cache_info(cls):
+        return (cls._dep_path_cache_stats[0], cls._dep_path_cache_stats[1],
+                cls._dep_path_cache_size)
+
+    # The list of the Word objects
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = [Word(self, i) for i in range(len(self.wordidxs))]
+        return self._words
+
+    # The TokenAttrs of the tokens
+    @property
+    def token_attrs(self):
+        if self._token_attrs is None:
+            self._token_attrs = TokenAttrs(self)
+        return self._token_attrs
 
     # Return a list of the indexes of all words in the dependency path from
     # the word at index word_index to the root
@@ -49,7 +116,7 @@ class Sentence(object):
                 if c == -1:
                     break
                 path.append(c)
-                c = self.words[c].dep_parent
+                c = self.dep_parents[c]
             except:
                 break
         return path
@@ -91,6 +158,7 @@ class Sentence(object):
     # the dependency path labels on the path from idx1 to idx2
     def get_direct_dependency_path_between_words(self, idx1, idx2):
         words_on_path = []
+        words = self.words
         c = idx1
         MAX_DEP_PATH_LEN = self._MAX_DEP_PATH_LEN
         while MAX_DEP_PATH_LEN > 0:
@@ -102,31 +170,280 @@ class Sentence(object):
                     break
                 elif c == idx1:
                     # we do not include the NER tag/lemma for idx1
-                    words_on_path.append(str(self.words[c].dep_path))
+                    words_on_path.append(str(self.dep_paths[c]))
                 else:
-                    words_on_path.append(str(self.words[c].dep_path) + "|" +
-                                         self.words[c].get_feature())
-                c = self.words[c].dep_parent
+                    words_on_path.append(str(self.dep_paths[c]) + "|" +
+                                         words[c].get_feature())
+                c = self.dep_parents[c]
             except:
                 break
         return words_on_path
 
+    # Preprocess the dependency tree. Return False if the tree is malformed
+    # (parents out of range, cycles, or paths too long), in which case the
+    # dependency paths are computed by walking the tree as in pharm.
+    def _build_dep_tree(self):
+        n = len(self.words)
+        if n >= self._MAX_DEP_PATH_LEN:
+            return False
+        parents = []
+        first_labels = []
+        labels = []
+        for i in range(n):
+            parent = self.dep_parents[i]
+            if self.ners[i] == 'O':
+                feature = self.lemmas[i]
+            else:
+                feature = self.ners[i]
+            if type(parent) is not int or parent < -1 or parent >= n or \
+                    not isinstance(feature, str):
+                return False
+            parents.append(parent)
+            first_labels.append(str(self.dep_paths[i]))
+            labels.append(first_labels[-1] + "|" + feature)
+        # Compute depths and roots, detecting cycles. -2 marks the words whose
+        # depth is being computed.
+        depths = [-1] * n
+        roots = [-1] * n
+        for i in range(n):
+            chain = []
+            c = i
+            while c != -1 and depths[c] == -1:
+                depths[c] = -2
+                chain.append(c)
+                c = parents[c]
+            if c == -1:
+                depth = -1
+                root = chain[-1] if chain else -1
+            elif depths[c] == -2:
+                return False
+            else:
+                depth = depths[c]
+                root = roots[c]
+            for c in reversed(chain):
+                depth += 1
+                depths[c] = depth
+                roots[c] = root
+        # Binary lifting: ancestors[k][i] is the ancestor of i 2^k levels
+        # up (or the root of the tree of i, if there is no such ancestor).
+        ancestors = [[i if parent == -1 else parent
+                      for i, parent in enumerate(parents)]]
+        for k in range(1, max(1, n.bit_length())):
+            prev = ancestors[-1]
+            ancestors.append([prev[prev[i]] for i in range(n)])
+        # Preorder of the words (visiting the trees by increasing root), so
+        # that the subtree of i is preorder[preorder_start[i]:preorder_end[i]]
+        children = [[] for i in range(n)]
+        for i in range(n):
+            if parents[i] != -1:
+                children[parents[i]].append(i)
+        preorder = []
+        preorder_start = [0] * n
+        preorder_end = [0] * n
+        for root in range(n):
+            if parents[root] != -1:
+                continue
+            stack = [root]
+            while stack:
+                c = stack.pop()
+                if c < 0:
+                    preorder_end[~c] = len(preorder)
+                    continue
+                preorder_start[c] = len(preorder)
+                preorder.append(c)
+                stack.append(~c)
+                stack.extend(reversed(children[c]))
+        # label_sums[i] is the sum of the lengths of the labels on the path
+        # from i to its root (both included), plus one for each of them (the
+        # "-" separators). It has an additional 0 at the end, so that
+        # label_sums[-1] is 0. first_lengths[i] is the length of the direct
+        # path feature from i to the root (see
+        # _get_direct_dep_path_feature()), so that the length of the one from
+        # i to its ancestor c is first_lengths[i] - label_sums[c].
+        label_sums = [0] * (n + 1)
+        for c in preorder:
+            label_sums[c] = label_sums[parents[c]] + len(labels[c]) + 1
+        first_lengths = [len(first_labels[i]) + label_sums[parents[i]]
+                         for i in range(n)]
+        self._dep_parents = parents
+        self._dep_depths = depths
+        self._dep_roots = roots
+        self._dep_ancestors = ancestors
+        self._dep_first_labels = first_labels
+        self._dep_labels = labels
+        # The neighbors of each word in the undirected tree, where the roots
+        # are connected to a virtual root with index n
+        neighbors = [[n if parent == -1 else parent] + children[i]
+                     for i, parent in enumerate(parents)]
+        neighbors.append([i for i in range(n) if parents[i] == -1])
+        self._dep_neighbors = neighbors
+        self._dep_preorder = preorder
+        self._dep_preorder_start = preorder_start
+        self._dep_preorder_end = preorder_end
+        self._dep_label_sums = label_sums
+        self._dep_first_lengths = first_lengths
+        return True
+
+    # Return True if the dependency tree is well formed and idx1 and idx2 are
+    # words of the sentence
+    def _has_dep_tree(self, idx1, idx2):
+        if self._dep_tree is None:
+            self._dep_tree = self._build_dep_tree()
+        n = len(self.words)
+        return self._dep_tree and type(idx1) is int and \
+            type(idx2) is int and 0 <= idx1 < n and 0 <= idx2 < n
+
+    # Return the lowest common ancestor of idx1 and idx2 in the (well formed)
+    # dependency tree, or None if they belong to different trees
+    def _get_dep_lca(self, idx1, idx2):
+        if self._dep_roots[idx1] != self._dep_roots[idx2]:
+            return None
+        depths = self._dep_depths
+        ancestors = self._dep_ancestors
+        if depths[idx1] < depths[idx2]:
+            idx1, idx2 = idx2, idx1
+        diff = depths[idx1] - depths[idx2]
+        k = 0
+        while diff:
+            if diff & 1:
+                idx1 = ancestors[k][idx1]
+            diff >>= 1
+            k += 1
+        if idx1 == idx2:
+            return idx1
+        for k in range(len(ancestors) - 1, -1, -1):
+            if ancestors[k][idx1] != ancestors[k][idx2]:
+                idx1 = ancestors[k][idx1]
+                idx2 = ancestors[k][idx2]
+        return self._dep_parents[idx1]
+
+    # Given two word idx1 and idx2, return the lowest common ancestor of the
+    # two words in the dependency tree, or None if there is none
+    def get_word_dep_lca(self, idx1, idx2):
+        if self._has_dep_tree(idx1, idx2):
+            return self._get_dep_lca(idx1, idx2)
+        return self.get_common_ancestor(self.get_path_till_root(idx1),
+                                        self.get_path_till_root(idx2))
+
+    # Same as "-".join(get_direct_dependency_path_between_words(idx1, idx2)),
+    # using the preprocessed dependency tree. idx2 is an ancestor of idx1, or
+    # None to go up to the root.
+    def _get_direct_dep_path_feature(self, idx1, idx2):
+        if idx1 == idx2:
+            return ""
+        if idx2 is None:
+            idx2 = -1
+        parents = self._dep_parents
+        labels = self._dep_labels
+        words_on_path = [self._dep_first_labels[idx1]]
+        c = parents[idx1]
+        while c != idx2:
+            words_on_path.append(labels[c])
+            c = parents[c]
+        return "-".join(words_on_path)
+
     # Given two word idx1 and idx2, return the dependency path feature between
     # them
     def get_word_dep_path(self, idx1, idx2):
-        path1 = self.get_path_till_root(idx1)
-        path2 = self.get_path_till_root(idx2)
+        cache = self._dep_path_cache
+        if cache is not None:
+            path = cache.get((idx1, idx2))
+            if path is not None:
+                self._dep_path_cache_stats[0] += 1
+                return path
+            self._dep_path_cache_stats[1] += 1
+        if not self._has_dep_tree(idx1, idx2):
+            path = self._get_word_dep_path_by_walking(idx1, idx2)
+        else:
+            parent = self._get_dep_lca(idx1, idx2)
+            path = self._get_direct_dep_path_feature(idx1, parent) + "@" + \
+                self._get_direct_dep_path_feature(idx2, parent)
+        if cache is not None and len(cache) < self._dep_path_cache_size:
+            cache[(idx1, idx2)] = path
+        return path
 
-        parent = self.get_common_ancestor(path1, path2)
+    # Given a word idx1, return the list of the lengths of the dependency path
+    # features between idx1 and each word of the sentence, i.e., the list of
+    # len(get_word_dep_path(idx1, idx2)) for each idx2. If the dependency tree
+    # is malformed, return instead a mapping computing the lengths on demand,
+    # as walking the tree to all the words would be too slow.
+    def get_word_dep_path_lengths(self, idx1):
+        lengths = self._dep_path_lengths_cache.get(idx1)
+        if lengths is not None:
+            return lengths
+        if not self._has_dep_tree(idx1, idx1):
+            lengths = _WalkedDepPathLengths(self, idx1)
+            self._dep_path_lengths_cache[idx1] = lengths
+            return lengths
+        parents = self._dep_parents
+        preorder = self._dep_preorder
+        start = self._dep_preorder_start
+        end = self._dep_preorder_end
+        label_sums = self._dep_label_sums
+        first_lengths = self._dep_first_lengths
+        # The words outside the tree of idx1 have no common ancestor with it:
+        # both paths go up to the root.
+        up_length = first_lengths[idx1] + 1
+        lengths = [up_length + length for length in first_lengths]
+        # The words in the subtree of each ancestor c of idx1, but not in the
+        # subtree of the previous one, have c as lowest common ancestor.
+        lengths[idx1] = 1
+        c = idx1
+        prev = idx1
+        while parents[c] != -1:
+            prev = c
+            c = parents[c]
+            up_length = first_lengths[idx1] - label_sums[c] + 1
+            lengths[c] = up_length
+            down_offset = up_length - label_sums[c]
+            for idx2 in preorder[start[c] + 1:start[prev]]:
+                lengths[idx2] = down_offset + first_lengths[idx2]
+            for idx2 in preorder[end[prev]:end[c]]:
+                lengths[idx2] = down_offset + first_lengths[idx2]
+        # The words in the subtree of idx1
+        down_offset = 1 - label_sums[idx1]
+        for idx2 in preorder[start[idx1] + 1:end[idx1]]:
+            lengths[idx2] = down_offset + first_lengths[idx2]
+        self._dep_path_lengths_cache[idx1] = lengths
+        return lengths
 
-        words_from_idx1_to_parents = \
-            self.get_direct_dependency_path_between_words(idx1, parent)
-        words_from_idx2_to_parents = \
-            self.get_direct_dependency_path_between_words(idx2, parent)
+    # Given a list of words idxs and a list of candidate words, return the pair
+    # (idx, candidate) with the shortest dependency path feature between them,
+    # among those shorter than max_length, or None if there is no such pair.
+    # Ties are broken in favor of the first of idxs, then of the first of the
+    # candidates.
+    def get_closest_word_pair(self, idxs, candidates, max_length=100):
+        min_length = max_length
+        closest = None
+        for idx in idxs:
+            lengths = self.get_word_dep_path_lengths(idx)
+            for candidate in candidates:
+                if lengths[candidate] < min_length:
+                    min_length = lengths[candidate]
+                    closest = (idx, candidate)
+        return closest
+
+    # Same as get_word_dep_path(), walking the dependency tree. Used when the
+    # tree is malformed.
+    def _get_word_dep_path_by_walking(self, idx1, idx2):
+        words_from_idx1_to_parents, words_from_idx2_to_parents = \
+            self._walk_word_dep_path(idx1, idx2)
 
         return "-".join(words_from_idx1_to_parents) + "@" + \
                "-".join(words_from_idx2_to_parents)
 
+    # Walk the dependency tree from idx1 and from idx2 up to their common
+    # ancestor, and return the two lists returned by
+    # get_direct_dependency_path_between_words(), with one element per edge
+    def _walk_word_dep_path(self, idx1, idx2):
+        path1 = self.get_path_till_root(idx1)
+        path2 = self.get_path_till_root(idx2)
+
+        parent = self.get_common_ancestor(path1, path2)
+
+        return (self.get_direct_dependency_path_between_words(idx1, parent),
+                self.get_direct_dependency_path_between_words(idx2, parent))
+
     # Given a mention, return the word before the first word of the mention,
     # if present
     def get_prev_wordobject(self, mention):
@@ -145,42 +462,84 @@ class Sentence(object):
         else:
             return self.words[end + 1]
 
+    # Given a mention, return the (at most) 5 shortest dependency path
+    # features between a word of the mention and a word outside of it. Ties
+    # are broken in favor of the first word of the mention, then of the first
+    # word outside of it. Only the features returned are built.
     def dep_parent(self, mention):
         begin = mention.words[0].in_sent_idx
         end = mention.words[-1].in_sent_idx
 
-        paths = []
-        for i in range(begin, end+1):
-            for j in range(0, len(self.words)):
-                if j >= begin and j <= end:
-                    continue
-
-                path = self.get_word_dep_path(i, j)
-                paths.append(path)
+        others = [j for j in range(len(self.words)) if j < begin or j > end]
+        pairs = []
+        for i in range(begin, end + 1):
+            lengths = self.get_word_dep_path_lengths(i)
+            pairs.extend((lengths[j], i, j) for j in others)
 
-        return sorted(paths, key=len)[0:min(5, len(paths))]
+        return [self.get_word_dep_path(i, j)
+                for length, i, j in heapq.nsmallest(5, pairs)]
 
     # Given two entities, return the feature of the shortest dependency path
-    # between word from one of to a word of the other.
+    # between a word of one and a word of the other, i.e., of the path with
+    # the fewest edges. Ties are broken in favor of the first word of entity1,
+    # then of the first word of entity2.
     def dep_path(self, entity1, entity2):
         begin1 = entity1.words[0].in_sent_idx
         end1 = entity1.words[-1].in_sent_idx
         begin2 = entity2.words[0].in_sent_idx
         end2 = entity2.words[-1].in_sent_idx
+        if not self._has_dep_tree(begin1, end1) or \
+                not self._has_dep_tree(begin2, end2):
+            # Walk the tree between each pair of words, and pick the path
+            # with the fewest edges, as below
+            path = ""
+            ll = 100000000  # Just a very large number
+            for idx1 in range(begin1, end1+1):
+                for idx2 in range(begin2, end2+1):
+                    words1, words2 = self._walk_word_dep_path(idx1, idx2)
+                    if len(words1) + len(words2) < ll:
+                        path = "-".join(words1) + "@" + "-".join(words2)
+                        ll = len(words1) + len(words2)
+            return path
+        closest = self._get_dep_closest_pair(range(begin1, end1+1),
+                                             range(begin2, end2+1))
+        if closest is None:
+            return ""
+        return self.get_word_dep_path(*closest)
 
-        paths = []
-        for idx1 in range(begin1, end1+1):
-            for idx2 in range(begin2, end2+1):
-                paths.append(self.get_word_dep_path(idx1, idx2))
-
-        # we pick the one that is shortest
-        path = ""
-        ll = 100000000  # Just a very large number
-        for p in paths:
-            if len(p) < ll:
-                path = p
-            ll = len(p)
-        return path
+    # Return the pair (source, target) of words at the minimum distance in the
+    # (well formed) dependency tree, breaking ties in favor of the smallest
+    # source, then of the smallest target, or None if there are no sources or
+    # no targets. This is a breadth-first search starting from all the sources
+    # at once, where each word visited remembers the smallest source at the
+    # minimum distance from it. The roots of the trees are connected to a
+    # virtual root, so that paths between words in different trees go through
+    # their roots, as in get_word_dep_path().
+    def _get_dep_closest_pair(self, sources, targets):
+        n = len(self.words)
+        neighbors = self._dep_neighbors
+        origins = [-1] * (n + 1)
+        is_target = [False] * (n + 1)
+        for target in targets:
+            is_target[target] = True
+        frontier = sorted(set(sources))
+        for source in frontier:
+            origins[source] = source
+        while frontier:
+            reached = [(origins[c], c) for c in frontier if is_target[c]]
+            if reached:
+                return min(reached)
+            next_origins = dict()
+            for c in frontier:
+                origin = origins[c]
+                for neighbor in neighbors[c]:
+                    if origins[neighbor] == -1 and \
+                            next_origins.get(neighbor, n) > origin:
+                        next_origins[neighbor] = origin
+            for neighbor, origin in next_origins.items():
+                origins[neighbor] = origin
+            frontier = list(next_origins)
+        return None
 
     # Return True if the sentence is 'weird', according to the following
     # criteria:
@@ -196,20 +555,33 @@ class Sentence(object):
         count_NA = 0
         count_minus = 0
         count_semicolon = 0
-        for word in self.words:
-            try:
-                float(word.word)
+        flags = self.token_attrs.flags
+        for i, token in enumerate(self.tokens):
+            if flags[i] & TokenAttrs.IS_FLOAT:
                 count_floats += 1
-            except ValueError:
-                pass
-            if word.word in ["NA", "Yes", "No"]:
+            if token in ["NA", "Yes", "No"]:
                 count_NA += 1
-            elif word.word == "—":
+            elif token == "—":
                 count_minus += 1
-            elif word.word == ";":
+            elif token == ";":
                 count_semicolon += 1
         if count_floats > 12 or count_NA > 6 or count_minus > 10 or \
                 count_semicolon > 6:
             return True
         else:
             return False
+
+
+# The lengths of the dependency path features between a word and the words of
+# a sentence with a malformed dependency tree, computed by walking the tree
+# the first time each one is accessed (see get_word_dep_path_lengths())
+class _WalkedDepPathLengths(dict):
+
+    def __init__(self, sentence, idx1):
+        self._sentence = sentence
+        self._idx1 = idx1
+
+    def __missing__(self, idx2):
+        length = len(self._sentence.get_word_dep_path(self._idx1, idx2))
+        self[idx2] = length
+        return length
@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+""" A TokenAttrs class
+
+The attributes of the tokens of a Sentence that the feature functions check
+over and over (whether the token is a number, a verb, a stopword, ...),
+computed once per token when sentence.token_attrs is first accessed.
+
+The boolean attributes of the token at position i are the bits of flags[i]
+(see the flags below). The extractors can register more flags for the tokens
+(or lemmas) that belong to their dictionaries with register_lookup().
+"""
+
+import collections
+import re
+
+_VERB_POS = re.compile('^VB[A-Z]*$')
+_DECIMAL = re.compile("^[0-9]+(.[0-9]+)?$")
+_SYMBOLS = re.compile(r"^(_|\W)+$")
+
+
+class TokenAttrs(object):
+
+    IS_FLOAT = 1 << 0  # float(token) succeeds
+    IS_YEAR = 1 << 1  # the token is an integer in (1950, 2014]
+    IS_DECIMAL = 1 << 2  # the token matches _DECIMAL
+    IS_SYMBOLS = 1 << 3  # the token contains only symbols (or '_')
+    IS_ALPHA = 1 << 4  # token.isalpha()
+    IS_ALNUM = 1 << 5  # token.isalnum()
+    IS_UPPER = 1 << 6  # token.isupper()
+    LEMMA_IS_FLOAT = 1 << 7  # float(lemma) succeeds
+    LEMMA_IS_ALPHA = 1 << 8  # lemma.isalpha()
+    LEMMA_IS_ALNUM = 1 << 9  # lemma.isalnum()
+    IS_VERB = 1 << 10  # the POS tag is a verb tag (VB, VBD, VBZ, ...)
+
+    # The flags registered with register_lookup(): (flag, column, collection)
+    _lookups = []
+    _next_flag = 1 << 11
+
+    # Register a new flag, set for the tokens whose value in 'column' (one of
+    # "tokens", "lemmas", "casefolded_tokens", and "casefolded_lemmas") is in
+    # 'collection', and return it. Must be called before the attributes of any
+    # sentence are computed.
+    @classmethod
+    def register_lookup(cls, column, collection):
+        if column not in ("tokens", "lemmas", "casefolded_tokens",
+                          "casefolded_lemmas"):
+            raise ValueError("Unknown column {}".format(column))
+        flag = cls._next_flag
+        cls._next_flag <<= 1
+        cls._lookups.append((flag, column, collection))
+        return flag
+
+    # The flags of the tokens, lemmas, and POS tags seen so far, as the same
+    # ones appear over and over in a corpus. Cleared when they get too large.
+    _CACHE_SIZE = 1 << 18
+    _token_flags = dict()
+    _lemma_flags = dict()
+    _pos_flags = dict()
+
+    def __init__(self, sentence):
+        tokens = sentence.tokens
+        lemmas = sentence.lemmas
+        self.casefolded_tokens = [token.casefold() for token in tokens]
+        self.casefolded_lemmas = [lemma.casefold() for lemma in lemmas]
+        # Number of occurrences of each token and of each lemma in the sentence
+        self.token_counts = collections.Counter(tokens)
+        self.lemma_counts = collections.Counter(lemmas)
+        token_flags = self._token_flags
+        lemma_flags = self._lemma_flags
+        pos_flags = self._pos_flags
+        if len(token_flags) + len(lemma_flags) > self._CACHE_SIZE:
+            token_flags.clear()
+            lemma_flags.clear()
+        self.flags = []
+        for token, lemma, pos in zip(tokens, lemmas, sentence.poses):
+            flags = token_flags.get(token)
+            if flags is None:
+                flags = self._get_token_flags(token)
+                token_flags[token] = flags
+            lemma_flag = lemma_flags.get(lemma)
+            if lemma_flag is None:
+                lemma_flag = self._get_lemma_flags(lemma)
+                lemma_flags[lemma] = lemma_flag
+            flags |= lemma_flag
+            if pos in pos_flags:
+                flags |= pos_flags[pos]
+            else:
+                pos_flags[pos] = self.IS_VERB if _VERB_POS.search(pos) else 0
+                flags |= pos_flags[pos]
+            self.flags.append(flags)
+        for flag, column, collection in self._lookups:
+            values = tokens if column == "tokens" else \
+                lemmas if column == "lemmas" else getattr(self, column)
+            for i, value in enumerate(values):
+                if value in collection:
+                    self.flags[i] |= flag
+
+    @classmethod
+    def _get_token_flags(cls, token):
+        flags = 0
+        try:
+            number = float(token)
+            flags |= cls.IS_FLOAT
+            if round(number) == number and number > 1950 and number <= 2014:
+                flags |= cls.IS_YEAR
+        except (ValueError, OverflowError):
+            pass
+        if _DECIMAL.match(token):
+            flags |= cls.IS_DECIMAL
+        if _SYMBOLS.match(token):
+            flags |= cls.IS_SYMBOLS
+        if token.isalpha():
+            flags |= cls.IS_ALPHA
+        if token.isalnum():
+            flags |= cls.IS_ALNUM
+        if token.isupper():
+            flags |= cls.IS_UPPER
+        return flags
+
+    @classmethod
+    def _get_lemma_flags(cls, lemma):
+        flags = 0
+        try:
+            float(lemma)
+            flags |= cls.LEMMA_IS_FLOAT
+        except ValueError:
+            pass
+        if lemma.isalpha():
+            flags |= cls.LEMMA_IS_ALPHA
+        if lemma.isalnum():
+            flags |= cls.LEMMA_IS_ALNUM
+        return flags
@@ -1,49 +1,78 @@
 #! /usr/bin/env python3
 """ A Word class
 
+A lightweight view on the word at a given position of a Sentence: the
+attributes of the word are read from the columns of the sentence (see
+dstruct/Sentence.py), so that creating a Word does not copy them.
+
 Originally obtained from the 'pharm' repository, but modified.
 """
 
 
 class Word(object):
 
-    doc_id = None
-    sent_id = None
-    in_sent_idx = None
-    word = None
-    pos = None
-    ner = None
-    lemma = None
-    dep_path = None
-    dep_parent = None
-    sent_id = None
-    box = None
-
-    def __init__(self, _doc_id, _sent_id, _in_sent_idx, _word, _pos, _ner,
-                 _lemma, _dep_path, _dep_parent, _box):
-        self.doc_id = _doc_id
-        self.sent_id = _sent_id
-        self.in_sent_idx = _in_sent_idx
-        self.word = _word
-        self.pos = _pos
-        self.ner = _ner
-        self.dep_parent = _dep_parent
-        self.dep_path = _dep_path
-        self.box = _box
-        self.lemma = _lemma
-        # If do not do the following, outputting an Array in the language will
-        # crash
-        # XXX (Matteo) This was in the pharm code, not sure what it means
-        # I actually don't think this should go here.
-        # self.lemma = self.lemma.replace('"', "''")
-        # self.lemma = self.lemma.replace('\\', "_")
+    __slots__ = ("sentence", "idx")
+
+    def __init__(self, _sentence, _idx):
+        # The Sentence containing the word, and the position of the word in
+        # its columns
+        self.sentence = _sentence
+        self.idx = _idx
+
+    @property
+    def doc_id(self):
+        return self.sentence.doc_id
+
+    @property
+    def sent_id(self):
+        return self.sentence.sent_id
+
+    @property
+    def in_sent_idx(self):
+        return self.sentence.wordidxs[self.idx]
+
+    @property
+    def word(self):
+        return self.sentence.tokens[self.idx]
+
+    @property
+    def pos(self):
+        return self.sentence.poses[self.idx]
+
+    @property
+    def ner(self):
+        return self.sentence.ners[self.idx]
+
+    @property
+    def lemma(self):
+        return self.sentence.lemmas[self.idx]
+
+    @property
+    def dep_path(self):
+        return self.sentence.dep_paths[self.idx]
+
+    @property
+    def dep_parent(self):
+        return self.sentence.dep_parents[self.idx]
+
+    @property
+    def box(self):
+        return self.sentence.bounding_boxes[self.idx]
+
+    # The stem of the word, if the stems of the sentence have been computed
+    # (see extract_hpoterm_mentions.py)
+    @property
+    def stem(self):
+        return self.sentence.stems[self.idx]
 
     def __repr__(self):
         return self.word
 
     # Return the NER tag if different than 'O', otherwise return the lemma
     def get_feature(self):
-        if self.ner == 'O':
-            return self.lemma
+        sentence = self.sentence
+        ner = sentence.ners[self.idx]
+        if ner == 'O':
+            return sentence.lemmas[self.idx]
         else:
-            return self.ner
+            return ner
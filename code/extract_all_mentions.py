@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+#
+# Run the gene mention, HPO term mention, and acronym extractors in a single
+# pass over the sentences
+#
+# USAGE: extract_all_mentions.py GENES_OUT HPOTERMS_OUT ACRONYMS_OUT [INPUT...]
+#
+# The input is the content of the sentences_input table (the input of
+# extract_gene_mentions.py and extract_hpoterm_mentions.py), read from the
+# INPUT files or from the standard input. Each sentence is decoded once, and
+# the same Sentence object is given to all the extractors. The output of each
+# extractor is written to its own file (the same lines as the extractor would
+# print), to be loaded in the gene_mentions, hpoterm_mentions, and acronyms
+# tables (e.g., with copy_table_from_file.sh).
+#
+# The acronyms are found at the document level, as in find_acronyms.py: the
+# sentences of a document must be consecutive in the input (e.g., sorted by
+# doc_id).
+
+import fileinput
+import sys
+
+import extract_gene_mentions
+import extract_hpoterm_mentions
+import find_acronyms
+from dstruct.Sentence import Sentence
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder, TSVWriter
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        sys.stderr.write("USAGE: {} GENES_OUT HPOTERMS_OUT ACRONYMS_OUT "
+                         "[INPUT...]\n".format(sys.argv[0]))
+        sys.exit(1)
+    # See extract_gene_mentions.py
+    Sentence.set_dep_path_cache(1 << 12)
+    # The bounding boxes are not used
+    decoder = TSVDecoder(SENTENCE_COLUMNS, used=[
+        "doc_id", "sent_id", "wordidxs", "words", "poses", "ners", "lemmas",
+        "dep_paths", "dep_parents"])
+    with open(sys.argv[1], 'wb') as genes_file, \
+            open(sys.argv[2], 'wb') as hpoterms_file, \
+            open(sys.argv[3], 'wb') as acronyms_file, \
+            TSVWriter(genes_file) as genes_writer, \
+            TSVWriter(hpoterms_file) as hpoterms_writer, \
+            TSVWriter(acronyms_file) as acronyms_writer, \
+            fileinput.input(files=sys.argv[4:]) as input_files:
+        # The current document, and the acronyms defined in it
+        doc_id = None
+        acronyms = dict()
+        for row in decoder.decode_lines(input_files):
+            # Create the sentence object
+            sentence = Sentence(
+                row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+                row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+                row.bounding_boxes)
+            # Print the acronyms of the previous document
+            if row.doc_id != doc_id:
+                if doc_id is not None:
+                    for line in find_acronyms.supervise(doc_id, acronyms):
+                        acronyms_writer.write(line)
+                doc_id = row.doc_id
+                acronyms = dict()
+            find_acronyms.add_acronyms(acronyms, sentence)
+            # Skip weird sentences
+            if sentence.is_weird():
+                continue
+            # Extract and supervise the gene and HPO term mention candidates
+            mentions = extract_gene_mentions.extract(sentence)
+            for mention in extract_gene_mentions.supervise(mentions, sentence):
+                genes_writer.write(mention.tsv_dump())
+            mentions = extract_hpoterm_mentions.extract(sentence)
+            for mention in extract_hpoterm_mentions.supervise(mentions,
+                                                              sentence):
+                hpoterms_writer.write(mention.tsv_dump())
+        if doc_id is not None:
+            for line in find_acronyms.supervise(doc_id, acronyms):
+                acronyms_writer.write(line)
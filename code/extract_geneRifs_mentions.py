@@ -7,32 +7,26 @@ import fileinput
 
 from dstruct.Sentence import Sentence
 from extract_gene_mentions import extract, add_features
-from helper.easierlife import get_dict_from_TSVline, TSVstring2list, no_op
 from helper.dictionaries import load_dict
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder, TSVWriter
 
 if __name__ == "__main__":
     # Load the merged genes dictionary
     merged_genes_dict = load_dict("merged_genes")
+    # The bounding boxes are not used
+    decoder = TSVDecoder(SENTENCE_COLUMNS + [("gene", "text")], used=[
+        "doc_id", "sent_id", "wordidxs", "words", "poses", "ners", "lemmas",
+        "dep_paths", "dep_parents", "gene"])
     # Process the input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line, ["doc_id", "sent_id", "wordidxs", "words", "poses",
-                       "ners", "lemmas", "dep_paths", "dep_parents",
-                       "bounding_boxes", "gene"],
-                [no_op, int, lambda x: TSVstring2list(x, int), TSVstring2list,
-                    TSVstring2list, TSVstring2list, TSVstring2list,
-                    TSVstring2list, lambda x: TSVstring2list(x, int),
-                    TSVstring2list, no_op])
+    with fileinput.input() as input_files, TSVWriter() as writer:
+        for row in decoder.decode_lines(input_files):
             # Create the Sentence object
             sentence = Sentence(
-                line_dict["doc_id"], line_dict["sent_id"],
-                line_dict["wordidxs"], line_dict["words"], line_dict["poses"],
-                line_dict["ners"], line_dict["lemmas"], line_dict["dep_paths"],
-                line_dict["dep_parents"], line_dict["bounding_boxes"])
+                row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+                row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+                row.bounding_boxes)
             # This is the 'labelled' gene that we know is in the sentence
-            gene = line_dict["gene"]
+            gene = row.gene
             # Get the main symbol (or list of symbols) for the labelled gene
             if gene in merged_genes_dict:
                 gene = merged_genes_dict[gene]
@@ -58,5 +52,5 @@ if __name__ == "__main__":
                     if g in mention.words[0].word or \
                             g in mention.entity.split("|"):
                         mention.is_correct = True
-                        print(mention.tsv_dump())
+                        writer.write(mention.tsv_dump())
                         break
@@ -4,14 +4,13 @@
 # perform distant supervision
 #
 
-import fileinput
-import re
-
 from dstruct.Mention import Mention
 from dstruct.Sentence import Sentence
-from helper.dictionaries import load_dict
-from helper.easierlife import get_all_phrases_in_sentence, \
-    get_dict_from_TSVline, TSVstring2list, no_op
+from dstruct.TokenAttrs import TokenAttrs
+from helper.dictionaries import PHRASE_IS_GENE, PHRASE_IS_HPOTERM_WITH_GENE, \
+    load_dict
+from helper.pool import run_extractor
+from helper.tsv import ARRAY_SEP, SENTENCE_COLUMNS, TSVDecoder
 
 DOC_ELEMENTS = frozenset(
     ["figure", "table", "figures", "tables", "fig", "fig.", "figs", "figs.",
@@ -115,112 +114,122 @@ neg_mentions_dict = load_dict("neg_gene_mentions")
 med_acrons_dict = load_dict("med_acrons")
 long_names_dict = load_dict("long_names")
 inverted_long_names = load_dict("inverted_long_names")
-hpoterms_with_gene = load_dict("hpoterms_with_gene")
 
 # Max mention length. We won't look at subsentences longer than this.
-max_mention_length = 0
-for key in merged_genes_dict:
-    length = len(key.split())
-    if length > max_mention_length:
-        max_mention_length = length
+max_mention_length = load_dict("merged_genes_max_length")
 # doubling to take into account commas and who knows what
 max_mention_length *= 2
 
+# Flags for the attributes of the tokens (see dstruct/TokenAttrs.py)
+IS_GENE = TokenAttrs.register_lookup("tokens", merged_genes_dict)
+LEMMA_IS_STOPWORD = TokenAttrs.register_lookup("lemmas", stopwords_dict)
+LEMMA_IS_KEYWORD = TokenAttrs.register_lookup("lemmas", KEYWORDS)
+IS_VERB_WITH_ALPHA_LEMMA = TokenAttrs.IS_VERB | TokenAttrs.LEMMA_IS_ALPHA
+
+# Trie of all the phrases that give origin to a mention candidate, so that we
+# can find them with a single scan of the sentence (see
+# helper/dictionaries.py)
+phrases_trie = load_dict("gene_phrases_trie")
+# The tokens that can start a phrase in the trie (see prefilter())
+phrases_first_tokens = phrases_trie.first_tokens()
+
+
+# Return True if the word at position idx is skipped when looking for the
+# lemma on the left or on the right of a mention candidate: it's a single
+# character, or it's a stopword (unless uppercase) or not alphanumeric, but not
+# a number.
+def is_skipped_context_word(sentence, idx):
+    flags = sentence.token_attrs.flags[idx]
+    return (((not flags & TokenAttrs.LEMMA_IS_ALNUM) or
+             (not flags & TokenAttrs.IS_UPPER and
+              flags & LEMMA_IS_STOPWORD)) and
+            not flags & TokenAttrs.IS_DECIMAL) or \
+        len(sentence.words[idx].lemma) == 1
+
 
 # Add features to a gene mention candidate
 def add_features(mention, sentence):
+    attrs = sentence.token_attrs
+    flags = attrs.flags
+    # The dependency paths are compared by their lengths (see
+    # Sentence.get_word_dep_path_lengths()), and only built for the words that
+    # give origin to a feature.
+    mention_idxs = [word.in_sent_idx for word in mention.words]
     # The verb closest to the candidate, with the path to it.
-    minl = 100
-    minp = None
-    minw = None
-    for word in mention.words:
-        for word2 in sentence.words:
-            if word2.lemma.isalpha() and re.search('^VB[A-Z]*$', word2.pos) \
-                    and word2.lemma != 'be':
-                # Ignoring "be" comes from pharm (Emily)
-                p = sentence.get_word_dep_path(word.in_sent_idx,
-                                               word2.in_sent_idx)
-                if len(p) < minl:
-                    minl = len(p)
-                    minp = p
-                    minw = word2.lemma
-    if minw:
-        mention.add_feature('VERB_[' + minw + ']' + minp)
+    # Ignoring "be" comes from pharm (Emily)
+    verbs = [word2.idx for word2 in sentence.words
+             if flags[word2.idx] & IS_VERB_WITH_ALPHA_LEMMA ==
+             IS_VERB_WITH_ALPHA_LEMMA and word2.lemma != 'be']
+    closest = sentence.get_closest_word_pair(mention_idxs, verbs)
+    if closest is not None and sentence.words[closest[1]].lemma:
+        mention.add_feature('VERB_[' + sentence.words[closest[1]].lemma +
+                            ']' + sentence.get_word_dep_path(*closest))
     # The keywords that appear in the sentence with the mention
+    keywords = []
+    for word2 in sentence.words:
+        if flags[word2.idx] & LEMMA_IS_KEYWORD:
+            kw = word2.lemma
+            if word2.lemma in KNOCK_KWS:
+                kw = "_KNOCKOUT"
+            elif word2.lemma in ANTIGENE_KWS:
+                kw = "_ANTIGENE"
+            elif word2.lemma in AMINO_ACID_KWS:
+                kw = "_AMINOACID"
+            # elif word2.lemma in DNA_KWS:
+            #    kw = "_DNA"
+            elif word2.lemma in DOWNREGULATION_KWS:
+                kw = "_DOWNREGULATION"
+            elif word2.lemma in UPREGULATION_KWS:
+                kw = "_UPREGULATION"
+            # elif word2.lemma in TUMOR_KWS:
+            #     kw = "_TUMOR"
+            # elif word2.lemma in GENE_KWS:
+            #     kw = "_GENE"
+            # elif word2.lemma in COEXPRESSION_KWS:
+            #    ke = "_COEXPRESSION"
+            keywords.append((word2.idx, kw))
     minl = 100
     minp = None
     minw = None
-    for word in mention.words:
-        for word2 in sentence.words:
-            if word2.lemma in KEYWORDS:
-                p = sentence.get_word_dep_path(
-                    word.in_sent_idx, word2.in_sent_idx)
-                kw = word2.lemma
-                if word2.lemma in KNOCK_KWS:
-                    kw = "_KNOCKOUT"
-                elif word2.lemma in ANTIGENE_KWS:
-                    kw = "_ANTIGENE"
-                elif word2.lemma in AMINO_ACID_KWS:
-                    kw = "_AMINOACID"
-                # elif word2.lemma in DNA_KWS:
-                #    kw = "_DNA"
-                elif word2.lemma in DOWNREGULATION_KWS:
-                    kw = "_DOWNREGULATION"
-                elif word2.lemma in UPREGULATION_KWS:
-                    kw = "_UPREGULATION"
-                # elif word2.lemma in TUMOR_KWS:
-                #     kw = "_TUMOR"
-                # elif word2.lemma in GENE_KWS:
-                #     kw = "_GENE"
-                # elif word2.lemma in COEXPRESSION_KWS:
-                #    ke = "_COEXPRESSION"
-                if len(p) < minl:
-                    minl = len(p)
+    for idx1 in mention_idxs:
+        word_lengths = sentence.get_word_dep_path_lengths(idx1)
+        for idx, kw in keywords:
+            if word_lengths[idx] < 100:
+                p = sentence.get_word_dep_path(idx1, idx)
+                if word_lengths[idx] < minl:
+                    minl = word_lengths[idx]
                     minp = p
                     minw = kw
-                if len(p) < 100:
-                    mention.add_feature("KEYWORD_[" + kw + "]" + p)
+                mention.add_feature("KEYWORD_[" + kw + "]" + p)
     # Special features for the keyword on the shortest dependency path
     if minw:
         mention.add_feature('EXT_KEYWORD_MIN_[' + minw + ']' + minp)
         mention.add_feature('KEYWORD_MIN_[' + minw + ']')
     # If another gene is present in the sentence, add a feature with that gene
     # and the path to it. This comes from pharm.
-    minl = 100
-    minp = None
-    minw = None
-    for word in mention.words:
-        for word2 in sentence.words:
-            if word2.in_sent_idx not in mention.wordidxs and \
-                    word2.word in merged_genes_dict:
-                p = sentence.get_word_dep_path(
-                    word.in_sent_idx, word2.in_sent_idx)
-                if len(p) < minl:
-                    minl = len(p)
-                    minp = p
-                    minw = word2.lemma
-    if minw:
-        mention.add_feature('OTHER_GENE_['+minw+']' + minp)
+    genes = [word2.idx for word2 in sentence.words
+             if word2.in_sent_idx not in mention.wordidxs and
+             flags[word2.idx] & IS_GENE]
+    closest = sentence.get_closest_word_pair(mention_idxs, genes)
+    if closest is not None and sentence.words[closest[1]].lemma:
+        mention.add_feature('OTHER_GENE_[' + sentence.words[closest[1]].lemma +
+                            ']' + sentence.get_word_dep_path(*closest))
         # mention.add_feature('OTHER_GENE_['+minw+']')
     # The lemma on the left of the candidate, whatever it is
     try:
-        left = sentence.words[mention.words[0].in_sent_idx-1].lemma
-        try:
-            float(left)
+        idx = mention.words[0].in_sent_idx - 1
+        left = sentence.words[idx].lemma
+        if flags[idx] & TokenAttrs.LEMMA_IS_FLOAT:
             left = "_NUMBER"
-        except ValueError:
-            pass
         mention.add_feature("NGRAM_LEFT_1_[" + left + "]")
     except IndexError:
         pass
     # The lemma on the right of the candidate, whatever it is
     try:
-        right = sentence.words[mention.words[-1].in_sent_idx+1].lemma
-        try:
-            float(right)
+        idx = mention.words[-1].in_sent_idx + 1
+        right = sentence.words[idx].lemma
+        if flags[idx] & TokenAttrs.LEMMA_IS_FLOAT:
             right = "_NUMBER"
-        except ValueError:
-            pass
         mention.add_feature("NGRAM_RIGHT_1_[" + right + "]")
     except IndexError:
         pass
@@ -229,52 +238,30 @@ def add_features(mention, sentence):
     # The concept of left or right is a little tricky here, as we are actually
     # looking at the first word that contains only letters and is not a
     # stopword.
+    # (This used to also check whether the Word objects were in the gene
+    # dictionary, which they never are.)
     idx = mention.wordidxs[0] - 1
     gene_on_left = None
     gene_on_right = None
-    while idx >= 0 and \
-            ((((not sentence.words[idx].lemma.isalnum() and not
-                sentence.words[idx] in merged_genes_dict) or
-                (not sentence.words[idx].word.isupper() and
-                 sentence.words[idx].lemma in stopwords_dict)) and
-                not re.match("^[0-9]+(.[0-9]+)?$", sentence.words[idx].word)
-                and not sentence.words[idx] in merged_genes_dict) or
-                len(sentence.words[idx].lemma) == 1):
+    while idx >= 0 and is_skipped_context_word(sentence, idx):
         idx -= 1
     if idx >= 0:
         mention.left_lemma = sentence.words[idx].lemma
-        if sentence.words[idx].word in merged_genes_dict and \
-                len(sentence.words[idx].word) > 3:
+        if flags[idx] & IS_GENE and len(sentence.words[idx].word) > 3:
             gene_on_left = sentence.words[idx].word
-        try:
-            year = float(sentence.words[idx].word)
-            if round(year) == year and year > 1950 and year <= 2014:
-                mention.add_feature("IS_YEAR_LEFT")
-        except:
-            pass
+        if flags[idx] & TokenAttrs.IS_YEAR:
+            mention.add_feature("IS_YEAR_LEFT")
     # The word on the right of the mention, if present, provided it's
     # alphanumeric but not a number
     idx = mention.wordidxs[-1] + 1
-    while idx < len(sentence.words) and \
-        ((((not sentence.words[idx].lemma.isalnum() and not
-            sentence.words[idx] in merged_genes_dict) or
-            (not sentence.words[idx].word.isupper() and
-                sentence.words[idx].lemma in stopwords_dict)) and
-            not re.match("^[0-9]+(.[0-9]+)?$", sentence.words[idx].word)
-            and not sentence.words[idx] in merged_genes_dict) or
-            len(sentence.words[idx].lemma) == 1):
+    while idx < len(sentence.words) and is_skipped_context_word(sentence, idx):
         idx += 1
     if idx < len(sentence.words):
         mention.right_lemma = sentence.words[idx].lemma
-        if sentence.words[idx].word in merged_genes_dict and \
-                len(sentence.words[idx].word) > 3:
+        if flags[idx] & IS_GENE and len(sentence.words[idx].word) > 3:
             gene_on_right = sentence.words[idx].word
-        try:
-            year = float(sentence.words[idx].word)
-            if round(year) == year and year > 1950 and year <= 2014:
-                mention.add_feature("IS_YEAR_RIGHT")
-        except:
-            pass
+        if flags[idx] & TokenAttrs.IS_YEAR:
+            mention.add_feature("IS_YEAR_RIGHT")
     if gene_on_left and gene_on_right:
         mention.add_feature("IS_BETWEEN_GENES")
     elif gene_on_left:
@@ -284,11 +271,11 @@ def add_features(mention, sentence):
     # The candidate is a single word that appears many times (more than 4) in
     # the sentence
     if len(mention.words) == 1 and \
-            [w.word for w in sentence.words].count(mention.words[0].word) > 4:
+            attrs.token_counts[mention.words[0].word] > 4:
         mention.add_feature("APPEARS_MANY_TIMES_IN_SENTENCE")
     # There are many PERSONs/ORGANIZATIONs/LOCATIONs in the sentence
     for ner in ["PERSON", "ORGANIZATION", "LOCATION"]:
-        if [x.lemma for x in sentence.words].count(ner) > 4:
+        if attrs.lemma_counts[ner] > 4:
             mention.add_feature("MANY_{}_IN_SENTENCE".format(ner))
     # The candidate comes after an organization, or a location, or a person.
     # We skip commas as they may trick us.
@@ -385,6 +372,7 @@ def add_features(mention, sentence):
 
 # Supervise the candidates.
 def supervise(mentions, sentence):
+    attrs = sentence.token_attrs
     phrase = " ".join([x.word for x in sentence.words])
     new_mentions = []
     for mention in mentions:
@@ -402,7 +390,8 @@ def supervise(mentions, sentence):
             mention_word_idx = mention.words[0].in_sent_idx
             if mention_word_idx < len(sentence.words) - 1:
                 next_word = sentence.words[mention_word_idx + 1].word
-                if next_word.casefold() in ["no", "no.", "#", ":"] and \
+                if attrs.casefolded_tokens[mention_word_idx + 1] in \
+                        ["no", "no.", "#", ":"] and \
                         mention_word_idx + 2 < len(sentence.words):
                     next_word = sentence.words[mention_word_idx + 2].word
                 try:
@@ -457,13 +446,13 @@ def supervise(mentions, sentence):
                 continue
             # The candidate comes after a "document element" (e.g., table, or
             # figure)
-            if sentence.words[idx].word.casefold() in DOC_ELEMENTS:
+            if attrs.casefolded_tokens[idx] in DOC_ELEMENTS:
                 mention.is_correct = False
                 mention.type = "GENE_SUP_doc"
                 continue
             # The candidate comes after an "individual" word (e.g.,
             # "individual")
-            if sentence.words[idx].word.casefold() in INDIVIDUALS and \
+            if attrs.casefolded_tokens[idx] in INDIVIDUALS and \
                     not mention.words[0].word.isalpha() and \
                     not len(mention.words[0].word) > 4:
                 mention.is_correct = False
@@ -471,7 +460,7 @@ def supervise(mentions, sentence):
                 continue
             # The candidate comes after a "type" word, and it is made only of
             # the letters "I" and "V"
-            if sentence.words[idx].lemma.casefold() in TYPES and \
+            if attrs.casefolded_lemmas[idx] in TYPES and \
                     set(mention.words[0].word).issubset(set(["I", "V"])):
                 mention.is_correct = False
                 mention.type = "GENE_SUP_type"
@@ -487,12 +476,10 @@ def supervise(mentions, sentence):
             # The candidate is followed by a ":" and the word after it is a
             # number (it's probably a quantity)
             if sentence.words[idx].word == ":":
-                try:
-                    float(sentence.words[idx + 1].word)
+                if idx + 1 < len(sentence.words) and \
+                        attrs.flags[idx + 1] & TokenAttrs.IS_FLOAT:
                     mention.is_correct = False
                     mention.type = "GENE_SUP_:"
-                except:  # both ValueError and IndexError
-                    pass
                 continue
             # The candidate comes before "et"
             if sentence.words[idx].word == "et":
@@ -614,30 +601,26 @@ def extract(sentence):
     sentence_is_upper = False
     if " ".join([x.word for x in sentence.words]).isupper():
         sentence_is_upper = True
-    # The following set keeps a list of indexes we already looked at and which
-    # contained a mention
-    history = set()
     words = sentence.words
-    # Scan all subsequences of the sentence of length up to max_mention_length
-    for start, end in get_all_phrases_in_sentence(sentence,
-                                                  max_mention_length):
-        if start in history or end in history:
-                continue
-        phrase = " ".join([word.word for word in words[start:end]])
-        if sentence_is_upper:  # This may not be a great idea...
-            phrase = phrase.casefold()
-        mention = None
+    tokens = [word.word for word in words]
+    if sentence_is_upper:  # This may not be a great idea...
+        tokens = sentence.token_attrs.casefolded_tokens
+    # Scan the sentence for the longest phrases in the trie. Phrases have
+    # length at most max_mention_length and never include the last word of the
+    # sentence. Once a phrase is found, the scan restarts after it, so that its
+    # words are not used for another mention.
+    for start, end, flags in phrases_trie.find_all(
+            tokens, max_mention_length, len(tokens) - 1):
+        phrase = " ".join(tokens[start:end])
         # If the phrase is a hpoterm name containing a gene, then it is a
         # mention candidate to supervise as negative
-        if phrase in hpoterms_with_gene:
+        if flags & PHRASE_IS_HPOTERM_WITH_GENE:
             mention = Mention("GENE_SUP_HPO", phrase, words[start:end])
             add_features(mention, sentence)
             mention.is_correct = False
             mentions.append(mention)
-            for i in range(start, end):
-                history.add(i)
         # If the phrase is in the gene dictionary, then is a mention candidate
-        if len(phrase) > 1 and phrase in merged_genes_dict:
+        if flags & PHRASE_IS_GENE:
             # The entity is a list of all the main symbols that could have the
             # phrase as symbol. They're separated by "|".
             mention = Mention("GENE",
@@ -647,39 +630,52 @@ def extract(sentence):
             add_features(mention, sentence)
             # Add mention to the list
             mentions.append(mention)
-            # Add indexes to history so that they are not used for another
-            # mention
-            for i in range(start, end):
-                history.add(i)
     return mentions
 
 
+# Return False if the sentence in the input line cannot contain any mention
+# candidate, i.e., none of its words can start a phrase in the trie (of its
+# words casefolded, if the sentence is uppercase, see extract()). Only the
+# words column of the line is split: the sentences for which we return False
+# are not decoded at all (see helper/pool.py).
+def prefilter(line):
+    fields = line.split("\t", 4)
+    if len(fields) < 5:
+        # Malformed, reported by the decoder
+        return True
+    tokens = fields[3].split(ARRAY_SEP)
+    if not phrases_first_tokens.isdisjoint(tokens):
+        return True
+    if fields[3].isupper():
+        return not phrases_first_tokens.isdisjoint(
+            token.casefold() for token in tokens)
+    return False
+
+
+# Process a row of the input, returning the output lines
+def process(row):
+    # Create the sentence object
+    sentence = Sentence(
+        row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+        row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+        row.bounding_boxes)
+    # Skip weird sentences
+    if sentence.is_weird():
+        return []
+    # Get list of mentions candidates in this sentence
+    mentions = extract(sentence)
+    # Supervise them
+    new_mentions = supervise(mentions, sentence)
+    return [mention.tsv_dump() for mention in new_mentions]
+
+
 if __name__ == "__main__":
+    # The same dependency path features are requested for all the candidates
+    # in a sentence
+    Sentence.set_dep_path_cache(1 << 12)
+    # The bounding boxes are not used
+    decoder = TSVDecoder(SENTENCE_COLUMNS, used=[
+        "doc_id", "sent_id", "wordidxs", "words", "poses", "ners", "lemmas",
+        "dep_paths", "dep_parents"])
     # Process the input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line, ["doc_id", "sent_id", "wordidxs", "words", "poses",
-                       "ners", "lemmas", "dep_paths", "dep_parents",
-                       "bounding_boxes"],
-                [no_op, int, lambda x: TSVstring2list(x, int), TSVstring2list,
-                    TSVstring2list, TSVstring2list, TSVstring2list,
-                    TSVstring2list, lambda x: TSVstring2list(x, int),
-                    TSVstring2list])
-            # Create the sentence object
-            sentence = Sentence(
-                line_dict["doc_id"], line_dict["sent_id"],
-                line_dict["wordidxs"], line_dict["words"], line_dict["poses"],
-                line_dict["ners"], line_dict["lemmas"], line_dict["dep_paths"],
-                line_dict["dep_parents"], line_dict["bounding_boxes"])
-            # Skip weird sentences
-            if sentence.is_weird():
-                continue
-            # Get list of mentions candidates in this sentence
-            mentions = extract(sentence)
-            # Supervise them
-            new_mentions = supervise(mentions, sentence)
-            # Print!
-            for mention in new_mentions:
-                print(mention.tsv_dump())
+    run_extractor(decoder, process, prefilter)
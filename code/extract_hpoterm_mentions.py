@@ -1,16 +1,14 @@
 #! /usr/bin/env python3
 
-import fileinput
 import random
-import re
-
-from nltk.stem.snowball import SnowballStemmer
 
 from dstruct.Mention import Mention
 from dstruct.Sentence import Sentence
-from helper.easierlife import get_all_phrases_in_sentence, \
-    get_dict_from_TSVline, TSVstring2list, no_op
+from dstruct.TokenAttrs import TokenAttrs
 from helper.dictionaries import load_dict
+from helper.stemmer import load_stemmer
+from helper.pool import run_extractor
+from helper.tsv import ARRAY_SEP, SENTENCE_COLUMNS, TSVDecoder
 
 max_mention_length = 8  # This is somewhat arbitrary
 
@@ -35,29 +33,44 @@ KEYWORDS = VAR_KWS | PATIENT_KWS
 # Load the dictionaries that we need
 english_dict = load_dict("english")
 stopwords_dict = load_dict("stopwords")
-inverted_hpoterms = load_dict("hpoterms_inverted")
 hponames_to_ids = load_dict("hponames_to_ids")
 genes_with_hpoterm = load_dict("genes_with_hpoterm")
-# hpodag = load_dict("hpoparents")
-
-
-stems = set()
-for hpo_name in inverted_hpoterms:
-    stem_set = inverted_hpoterms[hpo_name]
-    stems |= stem_set
-stems = frozenset(stems)
+# hpodag = load_dict("hpodag")
 
 # The keys of the following dictionary are sets of stems, and the values are
 # sets of hpoterms whose name, without stopwords, gives origin to the
 # corresponding set of stems (as key)
 hpoterms_dict = load_dict("hpoterms")
+# Maps each stem to the keys of hpoterms_dict containing it
+hpoterms_stem_index = load_dict("hpoterms_stem_index")
+# Whether a phrase with no stems can be a mention (it shouldn't)
+EMPTY_STEMS_IS_HPOTERM = frozenset() in hpoterms_dict
+
+# Flags for the attributes of the tokens (see dstruct/TokenAttrs.py)
+LEMMA_IS_STOPWORD = TokenAttrs.register_lookup("casefolded_lemmas",
+                                               stopwords_dict)
+LEMMA_IS_KEYWORD = TokenAttrs.register_lookup("lemmas", KEYWORDS)
+IS_ALPHA_VERB = TokenAttrs.IS_VERB | TokenAttrs.IS_ALPHA
 
-# Initialize the stemmer
-stemmer = SnowballStemmer("english")
+# Initialize the stemmer (precomputed stems, with fallback to NLTK)
+stemmer = load_stemmer()
+
+# The tokens that can be the first word of a gene long name containing an HPO
+# term name, and the tokens in the stem table whose stem is the stem of a word
+# of an HPO term name (see prefilter()). They are small sets: not shared, so
+# that they are frozensets.
+genes_with_hpoterm_first_tokens = load_dict("genes_with_hpoterm_first_tokens",
+                                            shared=False)
+try:
+    hpoterm_tokens = load_dict("hpoterm_tokens", shared=False)
+except FileNotFoundError:
+    # The stem table has not been built (see helper/stemmer.py)
+    hpoterm_tokens = frozenset()
 
 
 # Perform the supervision
 def supervise(mentions, sentence):
+    attrs = sentence.token_attrs
     for mention in mentions:
         # Skip if we already supervised it (e.g., random mentions or
         # gene long names)
@@ -65,12 +78,14 @@ def supervise(mentions, sentence):
             continue
         # The next word is 'gene' or 'protein', so it's actually a gene
         if mention.words[-1].in_sent_idx < len(sentence.words) - 1:
-            next_word = sentence.words[mention.words[-1].in_sent_idx + 1].word
-            if next_word.casefold() in ["gene", "protein"]:
+            next_word = attrs.casefolded_tokens[
+                mention.words[-1].in_sent_idx + 1]
+            if next_word in ["gene", "protein"]:
                 mention.is_correct = False
                 mention.type = "HPOTERM_SUP_GENE"
                 continue
-        mention_lemmas = set([x.lemma.casefold() for x in mention.words])
+        mention_lemmas = set([attrs.casefolded_lemmas[x.idx]
+                              for x in mention.words])
         name_words = set([x.casefold() for x in
                           mention.entity.split("|")[1].split()])
         # The mention is exactly the HPO name
@@ -83,18 +98,16 @@ def supervise(mentions, sentence):
 
 # Add features
 def add_features(mention, sentence):
+    flags = sentence.token_attrs.flags
     # The first alphanumeric lemma on the left of the mention, if present,
     idx = mention.wordidxs[0] - 1
     left_lemma_idx = -1
-    while idx >= 0 and not sentence.words[idx].word.isalnum():
+    while idx >= 0 and not flags[idx] & TokenAttrs.IS_ALNUM:
         idx -= 1
     try:
         mention.left_lemma = sentence.words[idx].lemma
-        try:
-            float(mention.left_lemma)
+        if flags[idx] & TokenAttrs.LEMMA_IS_FLOAT:
             mention.left_lemma = "_NUMBER"
-        except ValueError:
-            pass
         left_lemma_idx = idx
         mention.add_feature("NGRAM_LEFT_1_[{}]".format(
             mention.left_lemma))
@@ -103,15 +116,12 @@ def add_features(mention, sentence):
     # The first alphanumeric lemma on the right of the mention, if present,
     idx = mention.wordidxs[-1] + 1
     right_lemma_idx = -1
-    while idx < len(sentence.words) and not sentence.words[idx].word.isalnum():
+    while idx < len(sentence.words) and not flags[idx] & TokenAttrs.IS_ALNUM:
         idx += 1
     try:
         mention.right_lemma = sentence.words[idx].lemma
-        try:
-            float(mention.right_lemma)
+        if flags[idx] & TokenAttrs.LEMMA_IS_FLOAT:
             mention.right_lemma = "_NUMBER"
-        except ValueError:
-            pass
         right_lemma_idx = idx
         mention.add_feature("NGRAM_RIGHT_1_[{}]".format(
             mention.right_lemma))
@@ -141,7 +151,7 @@ def add_features(mention, sentence):
     minw = None
     for word in mention.words:
         for word2 in sentence.words:
-            if word2.lemma in KEYWORDS:
+            if flags[word2.idx] & LEMMA_IS_KEYWORD:
                 p = sentence.get_word_dep_path(word.in_sent_idx,
                                                word2.in_sent_idx)
                 kw = word2.lemma
@@ -162,8 +172,8 @@ def add_features(mention, sentence):
     minw = None
     for word in mention.words:
         for word2 in sentence.words:
-            if word2.word.isalpha() and re.search('^VB[A-Z]*$', word2.pos) \
-                    and word2.lemma != 'be':
+            if flags[word2.idx] & IS_ALPHA_VERB == IS_ALPHA_VERB and \
+                    word2.lemma != 'be':
                 p = sentence.get_word_dep_path(word.in_sent_idx,
                                                word2.in_sent_idx)
                 if len(p) < minl:
@@ -174,95 +184,151 @@ def add_features(mention, sentence):
             mention.add_feature('VERB_[' + minw + ']' + minp)
 
 
+# Return the random generator for the random negative candidates of the
+# sentence
+def get_negatives_random(doc_id, sent_id):
+    return random.Random("{}_{}".format(doc_id, sent_id))
+
+
 # Return a list of mention candidates extracted from the sentence
 def extract(sentence):
     mentions = []
     mention_ids = set()
     # If there are no English words in the sentence, we skip it.
     no_english_words = True
-    for word in sentence.words:
-        word.stem = stemmer.stem(word.word)  # Here so all words have stem
-        if len(word.word) > 2 and \
-                (word.word in english_dict or
-                 word.word.casefold() in english_dict):
+    for token in sentence.tokens:
+        if len(token) > 2 and \
+                (token in english_dict or token.casefold() in english_dict):
             no_english_words = False
     if no_english_words:
         return mentions
-    history = set()
-    # Iterate over each phrase of length at most max_mention_length
-    for start, end in get_all_phrases_in_sentence(sentence,
-                                                  max_mention_length):
-        if start in history or end - 1 in history:
-            continue
-        phrase = " ".join([word.word for word in sentence.words[start:end]])
+    # Here so all words have stem
+    sentence.stems = stemmer.stem_all(sentence.tokens)
+    num_words = len(sentence.words)
+    # For each word, whether its stem is part of the stems of the phrases
+    # containing it (i.e., it is not a stopword or a symbol)
+    attrs = sentence.token_attrs
+    has_stem = []
+    for i in range(num_words):
+        flags = attrs.flags[i]
+        has_stem.append(
+            not flags & TokenAttrs.IS_SYMBOLS and
+            (len(sentence.tokens[i]) == 1 or
+             not flags & LEMMA_IS_STOPWORD))
+    # The words that are part of a gene long name, and the words that are part
+    # of any mention, as bitmaps (bit i is set if the word with in_sent_idx i
+    # is used).
+    genes_history = 0
+    history = 0
+    genes_mentions = []
+    hpoterms_mentions = []
+    # Phrases are visited in the same order as get_all_phrases_in_sentence(),
+    # i.e., by increasing start and decreasing length, in a single scan. The
+    # phrases starting at 'start' are looked up among the gene long names, and
+    # those starting at 'start - max_mention_length' among the HPO terms, so
+    # that all the gene long names that may overlap the latter are known when
+    # they are looked up.
+    for start in range(num_words - 1 + max_mention_length):
+        max_end = min(num_words - 1, start + max_mention_length)
         # If the phrase is a gene long name containing a phenotype name, create
         # a candidate that we supervise as negative
-        if len(phrase) > 1 and phrase in genes_with_hpoterm:
-            mention = Mention("HPOTERM_SUP_GENEL",
-                              phrase,
-                              sentence.words[start:end])
-            mention.is_correct = False
-            add_features(mention, sentence)
-            mentions.append(mention)
-            for word in sentence.words[start:end]:
-                history.add(word.in_sent_idx)
-            continue
-    # Iterate over each phrase of length at most max_mention_length
-    for start, end in get_all_phrases_in_sentence(sentence,
-                                                  max_mention_length):
-        should_continue = False
-        for i in range(start, end):
-            if i in history:
-                should_continue = True
-                break
-        if should_continue:
+        for end in range(max_end, start, -1):
+            if (genes_history >> start) & 1 or \
+                    (genes_history >> (end - 1)) & 1:
+                continue
+            phrase = " ".join(sentence.tokens[start:end])
+            if len(phrase) > 1 and phrase in genes_with_hpoterm:
+                mention = Mention("HPOTERM_SUP_GENEL",
+                                  phrase,
+                                  sentence.words[start:end])
+                mention.is_correct = False
+                add_features(mention, sentence)
+                genes_mentions.append(mention)
+                for idx in sentence.wordidxs[start:end]:
+                    genes_history |= 1 << idx
+                history |= genes_history
+        hpo_start = start - max_mention_length
+        if hpo_start < 0:
             continue
-        phrase = " ".join([word.word for word in sentence.words[start:end]])
-        # The list of stems in the phrase (not from stopwords or symbols, and
-        # not already used for a mention)
-        phrase_stems = []
-        for word in sentence.words[start:end]:
-            if not re.match("^(_|\W)+$", word.word) and \
-                    (len(word.word) == 1 or
-                     word.lemma.casefold() not in stopwords_dict):
-                phrase_stems.append(word.stem)
-        phrase_stems_set = frozenset(phrase_stems)
-        if phrase_stems_set in hpoterms_dict:
+        max_end = min(num_words - 1, hpo_start + max_mention_length)
+        # Look for phrases of length at most max_mention_length whose set of
+        # stems is the set of stems of an HPO term. Extend the phrase starting
+        # at 'hpo_start' one word at a time, keeping the set of the HPO terms
+        # whose stems contain all the stems of the phrase, until there are
+        # none left: a longer phrase cannot be a mention. Record the ends of
+        # the phrases that are mentions.
+        phrase_stems_set = frozenset()
+        candidates = None
+        matches = []
+        for end in range(hpo_start + 1, max_end + 1):
+            if has_stem[end - 1] and \
+                    sentence.stems[end - 1] not in phrase_stems_set:
+                stem = sentence.stems[end - 1]
+                phrase_stems_set = phrase_stems_set | frozenset([stem])
+                stem_candidates = hpoterms_stem_index.get(stem, frozenset())
+                if candidates is None:
+                    candidates = stem_candidates
+                else:
+                    candidates = candidates & stem_candidates
+                if not candidates:
+                    break
+            if candidates is None:
+                if EMPTY_STEMS_IS_HPOTERM:
+                    matches.append((end, phrase_stems_set))
+            elif phrase_stems_set in candidates:
+                matches.append((end, phrase_stems_set))
+        for end, phrase_stems_set in reversed(matches):
+            # Skip the phrase if any of its words is already used
+            if (history >> hpo_start) & ((1 << (end - hpo_start)) - 1):
+                continue
             # Find the word objects of that match
             mention_words = []
             mention_lemmas = []
             mention_stems = []
-            for word in sentence.words[start:end]:
+            for word in sentence.words[hpo_start:end]:
+                lemma = attrs.casefolded_lemmas[word.idx]
                 if word.stem in phrase_stems_set and \
-                        word.lemma.casefold() not in mention_lemmas and \
+                        lemma not in mention_lemmas and \
                         word.stem not in mention_stems:
-                    mention_lemmas.append(word.lemma.casefold())
+                    mention_lemmas.append(lemma)
                     mention_words.append(word)
                     mention_stems.append(word.stem)
                     if len(mention_words) == len(phrase_stems_set):
                         break
-            entity = list(hpoterms_dict[phrase_stems_set])[0]
+            # The following is a way to avoid duplicates: the id of an HPO
+            # term mention only depends on the positions of its first and
+            # last words. It's ugly and not perfect
+            mention_key = (mention_words[0].in_sent_idx,
+                           mention_words[-1].in_sent_idx)
+            if mention_key in mention_ids:
+                continue
+            mention_ids.add(mention_key)
+            # Several HPO terms can have the same stems: take the smallest
+            # name, as the order of the set changes between processes
+            entity = min(hpoterms_dict[phrase_stems_set])
             mention = Mention(
                 "HPOTERM", hponames_to_ids[entity] + "|" + entity,
                 mention_words)
-            # The following is a way to avoid duplicates.
-            # It's ugly and not perfect
-            if mention.id() in mention_ids:
-                continue
-            mention_ids.add(mention.id())
             # Features
             add_features(mention, sentence)
-            mentions.append(mention)
+            hpoterms_mentions.append(mention)
             for word in mention_words:
-                history.add(word.in_sent_idx)
+                history |= 1 << word.in_sent_idx
+    mentions = genes_mentions + hpoterms_mentions
     # Generate some negative candidates at random, if this sentences didn't
-    # contain any other candidate. We want the candidates to be nouns.
-    if len(mentions) == 0 and random.random() <= NEG_PROB:
-        index = random.randint(0, len(sentence.words) - 1)
+    # contain any other candidate. We want the candidates to be nouns. The
+    # random numbers only depend on the sentence, so that the output does not
+    # depend on the order in which the sentences are processed (see
+    # helper/pool.py).
+    if len(mentions) > 0:
+        return mentions
+    rand = get_negatives_random(sentence.doc_id, sentence.sent_id)
+    if rand.random() <= NEG_PROB:
+        index = rand.randint(0, len(sentence.words) - 1)
         # We may not get a noun at random, so we try again if we don't.
         tries = 10
         while not sentence.words[index].pos.startswith("NN") and tries > 0:
-            index = random.randint(0, len(sentence.words) - 1)
+            index = rand.randint(0, len(sentence.words) - 1)
             tries -= 1
         if sentence.words[index].pos.startswith("NN"):
             mention = Mention(
@@ -274,32 +340,57 @@ def extract(sentence):
     return mentions
 
 
+# Return False if the sentence in the input line cannot contain any mention
+# candidate, nor get a random negative one: none of its words can start a gene
+# long name containing an HPO term name, or has the stem of a word of an HPO
+# term name (words that are not in the stem table may have any stem). Only the
+# words column of the line is split: the sentences for which we return False
+# are not decoded at all (see helper/pool.py).
+def prefilter(line):
+    # Any phrase of stopwords would be a mention
+    if EMPTY_STEMS_IS_HPOTERM:
+        return True
+    fields = line.split("\t", 4)
+    if len(fields) < 5:
+        # Malformed, reported by the decoder
+        return True
+    tokens = fields[3].split(ARRAY_SEP)
+    if not genes_with_hpoterm_first_tokens.isdisjoint(tokens) or \
+            not hpoterm_tokens.isdisjoint(tokens):
+        return True
+    stems = stemmer.table
+    for token in tokens:
+        if token not in stems:
+            return True
+    try:
+        rand = get_negatives_random(fields[0], int(fields[1]))
+    except ValueError:
+        # Malformed, reported by the decoder
+        return True
+    return rand.random() <= NEG_PROB
+
+
+# Process a row of the input, returning the output lines
+def process(row):
+    # Create the Sentence object
+    sentence = Sentence(
+        row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+        row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+        row.bounding_boxes)
+    # Skip weird sentences
+    if sentence.is_weird():
+        return []
+    # Extract mention candidates
+    mentions = extract(sentence)
+    # Supervise
+    new_mentions = supervise(mentions, sentence)
+    return [mention.tsv_dump() for mention in new_mentions]
+
+
 if __name__ == "__main__":
+    # The bounding boxes are not used
+    decoder = TSVDecoder(SENTENCE_COLUMNS, used=[
+        "doc_id", "sent_id", "wordidxs", "words", "poses", "ners", "lemmas",
+        "dep_paths", "dep_parents"])
     # Process the input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line,
-                ["doc_id", "sent_id", "wordidxs", "words", "poses", "ners",
-                    "lemmas", "dep_paths", "dep_parents", "bounding_boxes"],
-                [no_op, int, lambda x: TSVstring2list(x, int), TSVstring2list,
-                    TSVstring2list, TSVstring2list, TSVstring2list,
-                    TSVstring2list, lambda x: TSVstring2list(x, int),
-                    TSVstring2list])
-            # Create the Sentence object
-            sentence = Sentence(
-                line_dict["doc_id"], line_dict["sent_id"],
-                line_dict["wordidxs"], line_dict["words"], line_dict["poses"],
-                line_dict["ners"], line_dict["lemmas"], line_dict["dep_paths"],
-                line_dict["dep_parents"], line_dict["bounding_boxes"])
-            # Skip weird sentences
-            if sentence.is_weird():
-                continue
-            # Extract mention candidates
-            mentions = extract(sentence)
-            # Supervise
-            new_mentions = supervise(mentions, sentence)
-            # Print!
-            for mention in new_mentions:
-                print(mention.tsv_dump())
+    run_extractor(decoder, process, prefilter)
@@ -1,12 +1,20 @@
 #! /usr/bin/env python3
 #
 # Look for acronyms defined in a document that look like gene symbols
+#
+# The input has a row per document, with the columns of its sentences
+# aggregated into arrays, or a row per sentence with --sentences.
 
-import fileinput
 from dstruct.Sentence import Sentence
 from helper.dictionaries import load_dict
-from helper.easierlife import get_dict_from_TSVline, list2TSVarray, no_op, \
-    TSVstring2list
+from helper.easierlife import list2TSVarray, TSVstring2list
+from helper.pool import get_arg_parser, run_extractor
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder
+
+
+# Stands for the initials of the words that are more than one character long
+# when lowercase (see get_initials()), never equal to a lowercase letter
+INITIAL_PLACEHOLDER = "\0"
 
 
 # Return acronyms from sentence
@@ -63,6 +71,9 @@ def extract(sentence):
             acronyms.append(acronym)
             index = definition_end + 1
     else:
+        # The initials of the words (see get_initials()), computed for the
+        # first acronym candidate
+        initials = None
         # Second method: find 'A Better Example (ABE)' type of definitions.
         # Skip first and last word of sentence, to allow for "(" and ")".
         for word in sentence.words[1:-1]:
@@ -84,114 +95,170 @@ def extract(sentence):
                       sentence.words[word.in_sent_idx + 1].word == "]")):
                 word_idx = word.in_sent_idx
                 window_size = len(word.word)
-                # Look for a sequence of words coming before this one whose
-                # initials would create this acronym
-                start_idx = 0
-                while start_idx + window_size - 1 < word_idx:
+                if initials is None:
+                    initials = get_initials(sentence)
+                # Look for the first sequence of words coming before this one
+                # whose initials would create this acronym
+                start_idx = find_initials(sentence, initials, word.word,
+                                          word_idx)
+                if start_idx >= 0:
                     window_words = sentence.words[start_idx:(start_idx +
                                                              window_size)]
-                    is_definition = True
-                    for window_index in range(window_size):
-                        if window_words[window_index].word[0].lower() != \
-                                word.word[window_index].lower():
-                            is_definition = False
-                            break
                     definition = " ".join([w.word for w in window_words])
-                    # Only consider this acronym if the definition is valid
-                    if is_definition:
-                        acronym = dict()
-                        acronym["acronym"] = word.word
-                        acronym["definition"] = definition
-                        acronyms.append(acronym)
-                        break
-                    start_idx += 1
+                    acronym = dict()
+                    acronym["acronym"] = word.word
+                    acronym["definition"] = definition
+                    acronyms.append(acronym)
     return acronyms
 
 
+# Return the string of the lowercase initials of the words of the sentence, one
+# character per word. A word whose initial is more than one character long when
+# lowercase (e.g., "\u0130"), or that is empty, gets INITIAL_PLACEHOLDER
+# instead.
+def get_initials(sentence):
+    initials = []
+    for word in sentence.words:
+        initial = word.word[:1].lower()
+        initials.append(initial if len(initial) == 1 else INITIAL_PLACEHOLDER)
+    return "".join(initials)
+
+
+# Return the index of the first word of the first sequence of words ending
+# before the word at index 'end' whose lowercase initials are the lowercase
+# letters of 'acronym', or -1 if there is none. 'initials' is the string
+# returned by get_initials() for the sentence.
+def find_initials(sentence, initials, acronym, end):
+    # Lowercase each letter on its own ("\u03a3" is always "\u03c3")
+    letters = [letter.lower() for letter in acronym]
+    if all(len(letter) == 1 for letter in letters):
+        return initials.find("".join(letters), 0, end)
+    # Some letter is more than one character long when lowercase: compare the
+    # initials of the words one by one
+    words = sentence.words
+    for start in range(end - len(letters) + 1):
+        if all(words[start + i].word[:1].lower() == letter
+               for i, letter in enumerate(letters)):
+            return start
+    return -1
+
+
+# Given the definitions of the acronyms defined in a document (a dict from each
+# acronym to the set of its definitions), return the output lines, with the
+# acronyms supervised using their definitions
+def supervise(doc_id, acronyms):
+    lines = []
+    for acronym in acronyms:
+        contains_kw = False
+        is_correct = None
+        for definition in acronyms[acronym]:
+            # If the definition is in the gene dictionary, supervise as
+            # correct
+            if definition in merged_genes_dict:
+                is_correct = True
+                break
+            else:
+                # Check if the definition contains some keywords that
+                # make us suspect that it is probably a gene/protein.
+                # This list is incomplete, and it would be good to add
+                # to it.
+                if contains_kw:
+                    continue
+                for word in definition.split():
+                    if word.endswith("ase") and len(word) > 5:
+                        contains_kw = True
+                        break
+                if " gene" in definition or \
+                        "protein" in definition or \
+                        "factor" in definition or \
+                        "ligand" in definition or \
+                        "enzyme" in definition or \
+                        "receptor" in definition or \
+                        "pseudogene" in definition:
+                    contains_kw = True
+        # If no significant keyword in any definition, supervise as not
+        # correct
+        if not contains_kw and not is_correct:
+            is_correct = False
+        is_correct_str = "\\N"
+        if is_correct is not None:
+            is_correct_str = is_correct.__repr__()
+        lines.append("\t".join(
+            (doc_id, acronym,
+             list2TSVarray(list(acronyms[acronym]), quote=True),
+             is_correct_str)))
+    return lines
+
+
+# Add the definitions of the acronyms found in the sentence to 'acronyms' (a
+# dict from each acronym to the set of its definitions)
+def add_acronyms(acronyms, sentence):
+    for acronym in extract(sentence):
+        if acronym["acronym"] not in acronyms:
+            acronyms[acronym["acronym"]] = set()
+        acronyms[acronym["acronym"]].add(acronym["definition"])
+
+
+# Process a row of the input (a document), returning the output lines
+def process(row):
+    # Acronyms defined in the document
+    acronyms = dict()
+    for idx in range(len(row.sent_ids)):
+        wordidxs = TSVstring2list(row.wordidxss[idx], int)
+        words = TSVstring2list(row.wordss[idx])
+        # Create the Sentence object
+        sentence = Sentence(
+            row.doc_id, row.sent_ids[idx], wordidxs, words, None,
+            None, None, None, None, None)
+        # Extract the acronyms from the sentence
+        add_acronyms(acronyms, sentence)
+    # Supervise the acronyms
+    return supervise(row.doc_id, acronyms)
+
+
+# Process the rows of the sentences of a document (in the format of the
+# sentences_input table, see --sentences), returning the output lines
+def process_sentences(rows):
+    # Acronyms defined in the document
+    acronyms = dict()
+    for row in rows:
+        # Create the Sentence object
+        sentence = Sentence(
+            row.doc_id, row.sent_id, row.wordidxs, row.words, None, None,
+            None, None, None, None)
+        # Extract the acronyms from the sentence
+        add_acronyms(acronyms, sentence)
+    # Supervise the acronyms
+    return supervise(row.doc_id, acronyms)
+
+
 # Load the genes dictionary
 merged_genes_dict = load_dict("merged_genes")
 inverted_long_names = load_dict("inverted_long_names")
 
 if __name__ == "__main__":
-    # Process the input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line,
-                ["doc_id", "sent_ids", "wordidxss", "wordss", "posess", 
-                    "nerss", "lemmass", "dep_pathss", "dep_parentss",
-                    "bounding_boxess"],
-                [no_op, lambda x: TSVstring2list(x, int), 
-                    lambda x: TSVstring2list(x,sep='!~!'), 
-                    lambda x: TSVstring2list(x,sep='!~!'), 
-                    lambda x: TSVstring2list(x,sep='!~!'),
-                    lambda x: TSVstring2list(x,sep='!~!'),
-                    lambda x: TSVstring2list(x,sep='!~!'), 
-                    lambda x: TSVstring2list(x,sep='!~!'),
-                    lambda x: TSVstring2list(x,sep='!~!'),
-                    lambda x: TSVstring2list(x,sep='!~!')])
-            # Acronyms defined in the document
-            acronyms = dict()
-            for idx in range(len(line_dict["sent_ids"])):
-                wordidxs = TSVstring2list(line_dict["wordidxss"][idx], int)
-                words = TSVstring2list(line_dict["wordss"][idx])
-                poses = TSVstring2list(line_dict["posess"][idx])
-                ners = TSVstring2list(line_dict["nerss"][idx])
-                lemmas = TSVstring2list(line_dict["lemmass"][idx])
-                dep_paths = TSVstring2list(line_dict["dep_pathss"][idx])
-                dep_parents = TSVstring2list(line_dict["dep_parentss"][idx],
-                        int)
-                bounding_boxes = TSVstring2list(line_dict["bounding_boxess"][idx])
-                # Create the Sentence object
-                sentence = Sentence(
-                    line_dict["doc_id"], line_dict["sent_ids"][idx], wordidxs,
-                    words, poses, ners, lemmas, dep_paths, dep_parents,
-                    bounding_boxes)
-                # Extract the acronyms from the sentence
-                sen_acronyms = extract(sentence)
-                for acronym in sen_acronyms:
-                    if acronym["acronym"] not in acronyms:
-                        acronyms[acronym["acronym"]] = set()
-                    acronyms[acronym["acronym"]].add(acronym["definition"])
-            # Classify the acronyms
-            for acronym in acronyms:
-                contains_kw = False
-                is_correct = None
-                for definition in acronyms[acronym]:
-                    # If the definition is in the gene dictionary, supervise as
-                    # correct
-                    if definition in merged_genes_dict:
-                        is_correct = True
-                        break
-                    else:
-                        # Check if the definition contains some keywords that
-                        # make us suspect that it is probably a gene/protein.
-                        # This list is incomplete, and it would be good to add
-                        # to it.
-                        if contains_kw:
-                            continue
-                        for word in definition.split():
-                            if word.endswith("ase") and len(word) > 5:
-                                contains_kw = True
-                                break
-                        if " gene" in definition or \
-                                "protein" in definition or \
-                                "factor" in definition or \
-                                "ligand" in definition or \
-                                "enzyme" in definition or \
-                                "receptor" in definition or \
-                                "pseudogene" in definition:
-                            contains_kw = True
-                # If no significant keyword in any definition, supervise as not
-                # correct
-                if not contains_kw and not is_correct:
-                    is_correct = False
-                is_correct_str = "\\N"
-                if is_correct is not None:
-                    is_correct_str = is_correct.__repr__()
-                print("\t".join(
-                    (line_dict["doc_id"], acronym,
-                    list2TSVarray(list(acronyms[acronym]), quote=True),
-                    is_correct_str)))
-
+    parser = get_arg_parser()
+    parser.add_argument(
+        "--sentences", action="store_true",
+        help="the input has a row per sentence (as sentences_input), sorted "
+        "by doc_id and sent_id, instead of a row per document")
+    args = parser.parse_args()
+    if args.sentences:
+        # Only the words are used. The sentences of each document are
+        # processed as they are read.
+        decoder = TSVDecoder(SENTENCE_COLUMNS, used=[
+            "doc_id", "sent_id", "wordidxs", "words"])
+        run_extractor(decoder, process_sentences, group_by="doc_id",
+                      args=args)
+    else:
+        decoder = TSVDecoder([
+            ("doc_id", "text"), ("sent_ids", "int[]"),
+            ("wordidxss", "text[]", "!~!"), ("wordss", "text[]", "!~!"),
+            ("posess", "text[]", "!~!"), ("nerss", "text[]", "!~!"),
+            ("lemmass", "text[]", "!~!"), ("dep_pathss", "text[]", "!~!"),
+            ("dep_parentss", "text[]", "!~!"),
+            ("bounding_boxess", "text[]", "!~!")],
+            # Only the words are used
+            used=["doc_id", "sent_ids", "wordidxss", "wordss"])
+        # Process the input
+        run_extractor(decoder, process, args=args)
@@ -7,8 +7,7 @@ from dstruct.Mention import Mention
 from dstruct.Sentence import Sentence
 from dstruct.Relation import Relation
 from helper.dictionaries import load_dict
-from helper.easierlife import get_dict_from_TSVline, no_op, TSVstring2bool, \
-    TSVstring2list
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder, TSVWriter
 
 
 # Add features
@@ -156,44 +155,36 @@ def add_features(relation, gene_1_mention, gene_2_mention, sentence):
 
 
 if __name__ == "__main__":
+    columns = SENTENCE_COLUMNS + [
+        ("gene_1_entity", "text"), ("gene_1_wordidxs", "int[]"),
+        ("gene_1_is_correct", "bool"), ("gene_1_type", "text"),
+        ("gene_2_entity", "text"), ("gene_2_wordidxs", "int[]"),
+        ("gene_2_is_correct", "bool"), ("gene_2_type", "text")]
+    # The bounding boxes are not used
+    decoder = TSVDecoder(columns, used=[
+        column[0] for column in columns if column[0] != "bounding_boxes"])
     # Process input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line, ["doc_id", "sent_id", "wordidxs", "words", "poses",
-                       "ners", "lemmas", "dep_paths", "dep_parents",
-                       "bounding_boxes", "gene_1_entity", "gene_1_wordidxs",
-                       "gene_1_is_correct", "gene_1_type",
-                       "gene_2_entity", "gene_2_wordidxs",
-                       "gene_2_is_correct", "gene_2_type"],
-                [no_op, int, lambda x: TSVstring2list(x, int), TSVstring2list,
-                    TSVstring2list, TSVstring2list, TSVstring2list,
-                    TSVstring2list, lambda x: TSVstring2list(x, int),
-                    TSVstring2list, no_op, lambda x: TSVstring2list(x, int),
-                    TSVstring2bool, no_op, no_op, lambda x: TSVstring2list(x,
-                    int), TSVstring2bool, no_op])
+    with fileinput.input() as input_files, TSVWriter() as writer:
+        for row in decoder.decode_lines(input_files):
             # Create the sentence object where the two mentions appear
             sentence = Sentence(
-                line_dict["doc_id"], line_dict["sent_id"],
-                line_dict["wordidxs"], line_dict["words"], line_dict["poses"],
-                line_dict["ners"], line_dict["lemmas"], line_dict["dep_paths"],
-                line_dict["dep_parents"], line_dict["bounding_boxes"])
+                row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+                row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+                row.bounding_boxes)
             # Create the mentions
             gene_1_mention = Mention(
-                "GENE", line_dict["gene_1_entity"],
-                [sentence.words[j] for j in line_dict["gene_1_wordidxs"]])
-            gene_1_mention.is_correct = line_dict["gene_1_is_correct"]
-            gene_1_mention.type = line_dict["gene_1_type"]
+                "GENE", row.gene_1_entity,
+                [sentence.words[j] for j in row.gene_1_wordidxs])
+            gene_1_mention.is_correct = row.gene_1_is_correct
+            gene_1_mention.type = row.gene_1_type
             gene_2_mention = Mention(
-                "GENE", line_dict["gene_2_entity"],
-                [sentence.words[j] for j in line_dict["gene_2_wordidxs"]])
-            gene_2_mention.is_correct = line_dict["gene_2_is_correct"]
-            gene_2_mention.type = line_dict["gene_2_type"]
+                "GENE", row.gene_2_entity,
+                [sentence.words[j] for j in row.gene_2_wordidxs])
+            gene_2_mention.is_correct = row.gene_2_is_correct
+            gene_2_mention.type = row.gene_2_type
             # If the word indexes do not overlap, create the relation candidate
             # TODO there may be other cases. Check with Emily.
-            if not set(line_dict["gene_1_wordidxs"]) & \
-                    set(line_dict["gene_2_wordidxs"]):
+            if not set(row.gene_1_wordidxs) & set(row.gene_2_wordidxs):
                 relation = Relation(
                     "GENEGENE", gene_1_mention, gene_2_mention)
                 # Add features
@@ -210,4 +201,4 @@ if __name__ == "__main__":
                     relation.type = "GENEGENE_SUP_F"
                 # TODO Check in Emily's code how to supervise as True
                 # Print!
-                print(relation.tsv_dump())
+                writer.write(relation.tsv_dump())
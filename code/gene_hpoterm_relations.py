@@ -1,13 +1,16 @@
 #! /usr/bin/env python3
 
-import fileinput
-import re
+import bisect
+import collections
 
 from dstruct.Mention import Mention
 from dstruct.Sentence import Sentence
 from dstruct.Relation import Relation
+from dstruct.TokenAttrs import TokenAttrs
 from helper.dictionaries import load_dict
-from helper.easierlife import get_dict_from_TSVline, no_op, TSVstring2list
+from helper.easierlife import TSVstring2list, dedup_unsupervised_copies
+from helper.pool import run_extractor
+from helper.tsv import SENTENCE_COLUMNS, TSVDecoder
 
 
 # Add features
@@ -29,37 +32,18 @@ def add_features(relation, gene_mention, hpoterm_mention, sentence):
         inv = "INV_"
 
     # Verbs between the mentions
+    verbs = []
     verbs_between = []
-    minl_gene = 100
-    minp_gene = None
-    minw_gene = None
-    mini_gene = None
-    minl_hpo = 100
-    # minp_hpo = None
-    minw_hpo = None
-    mini_hpo = None
     neg_found = False
     # Look all the words, as in the dependency path there could be words that
     # are close to both mentions but not between them
+    flags = sentence.token_attrs.flags
     for i in range(len(sentence.words)):
         # The filtering of the brackets and commas is from Emily's code.
-        if re.search('^VB[A-Z]*$', sentence.words[i].pos) and \
+        if flags[i] & TokenAttrs.IS_VERB and \
                 sentence.words[i].word not in ["{", "}", "(", ")", "[", "]"] \
                 and "," not in sentence.words[i].word:
-            p_gene = sentence.get_word_dep_path(
-                betw_start, sentence.words[i].in_sent_idx)
-            p_hpo = sentence.get_word_dep_path(
-                sentence.words[i].in_sent_idx, betw_end)
-            if len(p_gene) < minl_gene:
-                minl_gene = len(p_gene)
-                minp_gene = p_gene
-                minw_gene = sentence.words[i].lemma
-                mini_gene = sentence.words[i].in_sent_idx
-            if len(p_hpo) < minl_hpo:
-                minl_hpo = len(p_hpo)
-                #  minp_hpo = p_hpo
-                minw_hpo = sentence.words[i].lemma
-                mini_hpo = sentence.words[i].in_sent_idx
+            verbs.append(i)
             # Look for negation.
             if i > 0 and sentence.words[i-1].lemma in \
                     ["no", "not", "neither", "nor"]:
@@ -70,6 +54,22 @@ def add_features(relation, gene_mention, hpoterm_mention, sentence):
                         sentence.words[i].lemma)
             else:
                 verbs_between.append(sentence.words[i])
+    # The verbs closest to the two mentions (the dependency path features
+    # have the same length in both directions)
+    minl_gene = 100
+    minw_gene = None
+    mini_gene = None
+    closest = sentence.get_closest_word_pair([betw_start], verbs)
+    if closest is not None:
+        mini_gene = closest[1]
+        minl_gene = sentence.get_word_dep_path_lengths(betw_start)[mini_gene]
+        minw_gene = sentence.words[mini_gene].lemma
+    minw_hpo = None
+    mini_hpo = None
+    closest = sentence.get_closest_word_pair([betw_end], verbs)
+    if closest is not None:
+        mini_hpo = closest[1]
+        minw_hpo = sentence.words[mini_hpo].lemma
     if len(verbs_between) == 1 and not neg_found:
         relation.add_feature(inv + "SINGLE_VERB_[%s]" % verbs_between[0].lemma)
     else:
@@ -78,7 +78,7 @@ def add_features(relation, gene_mention, hpoterm_mention, sentence):
                     verb.in_sent_idx < betw_end:
                 relation.add_feature(inv + "VERB_[%s]" % verb)
     if mini_hpo == mini_gene and mini_gene is not None and \
-            len(minp_gene) < 50:  # and "," not in minw_gene:
+            minl_gene < 50:  # and "," not in minw_gene:
         # feature = inv + 'MIN_VERB_[' + minw_gene + ']' + minp_gene
         # features.append(feature)
         feature = inv + 'MIN_VERB_[' + minw_gene + ']'
@@ -118,13 +118,11 @@ def add_features(relation, gene_mention, hpoterm_mention, sentence):
         # TODO: We would probably need distant supervision for these
         if neg_word_index > -1:
             gene_p = None
-            gene_l = 100
-            for word in sentence.words[gene_start:gene_end+1]:
-                p = sentence.get_word_dep_path(
-                    word.in_sent_idx, neg_word_index)
-                if len(p) < gene_l:
-                    gene_p = p
-                    gene_l = len(p)
+            closest = sentence.get_closest_word_pair(
+                [word.in_sent_idx for word in
+                 sentence.words[gene_start:gene_end+1]], [neg_word_index])
+            if closest is not None:
+                gene_p = sentence.get_word_dep_path(*closest)
             if gene_p:
                 relation.add_feature(inv + "NEG_[" + gene_p + "]")
             # hpo_p = None
@@ -221,158 +219,161 @@ def supervise(relation, gene_mention, hpoterm_mention, sentence):
 # Load the gene<->hpoterm dictionary
 genehpoterms_dict = load_dict("genehpoterms")
 
+
+# The values of the is_correct column of the mentions
+IS_CORRECTS = {"n": None, "f": False, "t": True}
+
+# Maximum number of words between the mentions of a relation candidate
+MAX_DISTANCE = 50
+
+
+# A mention of the input, before the Mention object is created: the indexes of
+# its words in the sentence, their set, the first and last in_sent_idx of the
+# words, and the is_correct and type of the mention
+Span = collections.namedtuple(
+    "Span", ["wordidxs", "wordidxs_set", "first", "last", "is_correct",
+             "type"])
+
+
+# Return the list of the Span of each mention, given the columns of the input
+def get_spans(sentence, wordidxss, is_corrects, types):
+    spans = []
+    for i in range(len(wordidxss)):
+        wordidxs = TSVstring2list(wordidxss[i], int)
+        in_sent_idxs = [sentence.words[j].in_sent_idx for j in wordidxs]
+        assert is_corrects[i] in IS_CORRECTS
+        assert not types[i].endswith("_UNSUP")
+        spans.append(Span(wordidxs, frozenset(wordidxs), min(in_sent_idxs),
+                          max(in_sent_idxs), IS_CORRECTS[is_corrects[i]],
+                          types[i]))
+    return spans
+
+
+# Return the list of the pairs (gene index, hpoterm index) of the mentions
+# that do not overlap and are not too far away, ordered by gene and then by
+# hpoterm. The hpoterms are sorted by their first word, so that only those in
+# a window around each gene are compared with it.
+def get_pairs(gene_spans, hpoterm_spans):
+    pairs = []
+    if not hpoterm_spans:
+        return pairs
+    order = sorted(range(len(hpoterm_spans)),
+                   key=lambda h_idx: hpoterm_spans[h_idx].first)
+    firsts = [hpoterm_spans[h_idx].first for h_idx in order]
+    max_length = max(span.last - span.first for span in hpoterm_spans)
+    for g_idx, gene in enumerate(gene_spans):
+        # The hpoterms that end more than MAX_DISTANCE words before the gene
+        # or start more than MAX_DISTANCE words after it are too far away
+        window = order[
+            bisect.bisect_left(firsts,
+                               gene.first - MAX_DISTANCE - max_length):
+            bisect.bisect_right(firsts, gene.last + MAX_DISTANCE)]
+        for h_idx in sorted(window):
+            hpoterm = hpoterm_spans[h_idx]
+            # Skip if the word indexes overlap
+            if not gene.wordidxs_set.isdisjoint(hpoterm.wordidxs_set):
+                continue
+            # Skip if the mentions are too far away
+            limits = sorted((gene.first, hpoterm.first, gene.last,
+                             hpoterm.last))
+            if limits[2] - limits[1] > MAX_DISTANCE:
+                continue
+            pairs.append((g_idx, h_idx))
+    return pairs
+
+
+# Create the Mention object of a Span
+def create_mention(_type, entity, span, sentence):
+    mention = Mention(_type, entity,
+                      [sentence.words[j] for j in span.wordidxs])
+    mention.is_correct = span.is_correct
+    mention.type = span.type
+    return mention
+
+
+# Process a row of the input, returning the output lines
+def process(row):
+    lines = []
+    # Remove the genes that are unsupervised copies or duplicates
+    supervised = []
+    for i in range(len(row.gene_is_corrects)):
+        if row.gene_is_corrects[i] == "n":
+            supervised.append(False)
+        elif row.gene_types[i] != "GENE_SUP_contr_2":
+            supervised.append(True)
+        else:
+            # To avoid duplicates
+            supervised.append(None)
+    to_keep = dedup_unsupervised_copies(row.gene_wordidxss, supervised)
+    gene_entities = []
+    gene_wordidxss = []
+    gene_is_corrects = []
+    gene_types = []
+    for i in to_keep:
+        gene_entities.append(row.gene_entities[i])
+        gene_wordidxss.append(row.gene_wordidxss[i])
+        gene_is_corrects.append(row.gene_is_corrects[i])
+        gene_types.append(row.gene_types[i])
+    # Remove the hpoterms that are unsupervised copies
+    to_keep = dedup_unsupervised_copies(
+        row.hpoterm_wordidxss,
+        [is_correct != "n" for is_correct in row.hpoterm_is_corrects])
+    hpoterm_entities = []
+    hpoterm_wordidxss = []
+    hpoterm_is_corrects = []
+    hpoterm_types = []
+    for i in to_keep:
+        hpoterm_entities.append(row.hpoterm_entities[i])
+        hpoterm_wordidxss.append(row.hpoterm_wordidxss[i])
+        hpoterm_is_corrects.append(row.hpoterm_is_corrects[i])
+        hpoterm_types.append(row.hpoterm_types[i])
+    # Create the sentence object where the two mentions appear
+    sentence = Sentence(
+        row.doc_id, row.sent_id, row.wordidxs, row.words, row.poses,
+        row.ners, row.lemmas, row.dep_paths, row.dep_parents,
+        row.bounding_boxes)
+    # Skip weird sentences
+    if sentence.is_weird():
+        return lines
+    # Parse the word indexes of each mention once
+    gene_spans = get_spans(sentence, gene_wordidxss, gene_is_corrects,
+                           gene_types)
+    if not gene_spans:
+        return lines
+    hpoterm_spans = get_spans(sentence, hpoterm_wordidxss,
+                              hpoterm_is_corrects, hpoterm_types)
+    # The mentions are created only if they are in a relation candidate
+    gene_mentions = [None] * len(gene_spans)
+    hpoterm_mentions = [None] * len(hpoterm_spans)
+    for g_idx, h_idx in get_pairs(gene_spans, hpoterm_spans):
+        if gene_mentions[g_idx] is None:
+            gene_mentions[g_idx] = create_mention(
+                "GENE", gene_entities[g_idx], gene_spans[g_idx], sentence)
+        if hpoterm_mentions[h_idx] is None:
+            hpoterm_mentions[h_idx] = create_mention(
+                "hpoterm", hpoterm_entities[h_idx], hpoterm_spans[h_idx],
+                sentence)
+        gene_mention = gene_mentions[g_idx]
+        hpoterm_mention = hpoterm_mentions[h_idx]
+        relation = Relation("GENEHPOTERM", gene_mention, hpoterm_mention)
+        # Add features
+        add_features(relation, gene_mention, hpoterm_mention, sentence)
+        # Supervise
+        supervise(relation, gene_mention, hpoterm_mention, sentence)
+        # Print!
+        lines.append(relation.tsv_dump())
+    return lines
+
+
 if __name__ == "__main__":
+    columns = SENTENCE_COLUMNS + [
+        ("gene_entities", "text[]"), ("gene_wordidxss", "text[]", "!~!"),
+        ("gene_is_corrects", "text[]"), ("gene_types", "text[]"),
+        ("hpoterm_entities", "text[]"),
+        ("hpoterm_wordidxss", "text[]", "!~!"),
+        ("hpoterm_is_corrects", "text[]"), ("hpoterm_types", "text[]")]
+    # The bounding boxes are not used
+    decoder = TSVDecoder(columns, used=[
+        column[0] for column in columns if column[0] != "bounding_boxes"])
     # Process input
-    with fileinput.input() as input_files:
-        for line in input_files:
-            # Parse the TSV line
-            line_dict = get_dict_from_TSVline(
-                line, ["doc_id", "sent_id", "wordidxs", "words", "poses",
-                       "ners", "lemmas", "dep_paths", "dep_parents",
-                       "bounding_boxes", "gene_entities", "gene_wordidxss",
-                       "gene_is_corrects", "gene_types",
-                       "hpoterm_entities", "hpoterm_wordidxss",
-                       "hpoterm_is_corrects", "hpoterm_types"],
-                [no_op, int, lambda x: TSVstring2list(x, int), TSVstring2list,
-                 TSVstring2list, TSVstring2list, TSVstring2list,
-                 TSVstring2list, lambda x: TSVstring2list(x, int),
-                 TSVstring2list,  # these are for the sentence
-                 TSVstring2list, lambda x: TSVstring2list(x, sep="!~!"),
-                 TSVstring2list, TSVstring2list,  # these are for the genes
-                 TSVstring2list, lambda x: TSVstring2list(x, sep="!~!"),
-                 TSVstring2list, TSVstring2list,  # these are for the HPO
-                 ])
-            # Remove the genes that are unsupervised copies or duplicates
-            supervised_idxs = set()
-            unsupervised_idxs = set()
-            for i in range(len(line_dict["gene_is_corrects"])):
-                if line_dict["gene_is_corrects"][i] == "n":
-                    unsupervised_idxs.add(i)
-                else:
-                    if line_dict["gene_types"][i] != "GENE_SUP_contr_2":
-                        # The above condition is to avoid duplicates
-                        supervised_idxs.add(i)
-            survived_unsuperv_idxs = set()
-            for i in unsupervised_idxs:
-                wordidxs = line_dict["gene_wordidxss"][i]
-                found = False
-                for j in supervised_idxs:
-                    if line_dict["gene_wordidxss"][j] == wordidxs:
-                        found = True
-                        break
-                if not found:
-                    survived_unsuperv_idxs.add(i)
-            to_keep = sorted(survived_unsuperv_idxs | supervised_idxs)
-            new_gene_entities = []
-            new_gene_wordidxss = []
-            new_gene_is_corrects = []
-            new_gene_types = []
-            for i in to_keep:
-                new_gene_entities.append(line_dict["gene_entities"][i])
-                new_gene_wordidxss.append(line_dict["gene_wordidxss"][i])
-                new_gene_is_corrects.append(line_dict["gene_is_corrects"][i])
-                new_gene_types.append(line_dict["gene_types"][i])
-            line_dict["gene_entities"] = new_gene_entities
-            line_dict["gene_wordidxss"] = new_gene_wordidxss
-            line_dict["gene_is_corrects"] = new_gene_is_corrects
-            line_dict["gene_types"] = new_gene_types
-            # Remove the hpoterms that are unsupervised copies
-            supervised_idxs = set()
-            unsupervised_idxs = set()
-            for i in range(len(line_dict["hpoterm_is_corrects"])):
-                if line_dict["hpoterm_is_corrects"][i] == "n":
-                    unsupervised_idxs.add(i)
-                else:
-                    supervised_idxs.add(i)
-            survived_unsuperv_idxs = set()
-            for i in unsupervised_idxs:
-                wordidxs = line_dict["hpoterm_wordidxss"][i]
-                found = False
-                for j in supervised_idxs:
-                    if line_dict["hpoterm_wordidxss"][j] == wordidxs:
-                        found = True
-                        break
-                if not found:
-                    survived_unsuperv_idxs.add(i)
-            to_keep = sorted(survived_unsuperv_idxs | supervised_idxs)
-            new_hpoterm_entities = []
-            new_hpoterm_wordidxss = []
-            new_hpoterm_is_corrects = []
-            new_hpoterm_types = []
-            for i in to_keep:
-                new_hpoterm_entities.append(line_dict["hpoterm_entities"][i])
-                new_hpoterm_wordidxss.append(line_dict["hpoterm_wordidxss"][i])
-                new_hpoterm_is_corrects.append(
-                    line_dict["hpoterm_is_corrects"][i])
-                new_hpoterm_types.append(line_dict["hpoterm_types"][i])
-            line_dict["hpoterm_entities"] = new_hpoterm_entities
-            line_dict["hpoterm_wordidxss"] = new_hpoterm_wordidxss
-            line_dict["hpoterm_is_corrects"] = new_hpoterm_is_corrects
-            line_dict["hpoterm_types"] = new_hpoterm_types
-            # Create the sentence object where the two mentions appear
-            sentence = Sentence(
-                line_dict["doc_id"], line_dict["sent_id"],
-                line_dict["wordidxs"], line_dict["words"], line_dict["poses"],
-                line_dict["ners"], line_dict["lemmas"], line_dict["dep_paths"],
-                line_dict["dep_parents"], line_dict["bounding_boxes"])
-            # Skip weird sentences
-            if sentence.is_weird():
-                continue
-            # Iterate over each pair of (gene,phenotype) mention
-            for g_idx in range(len(line_dict["gene_is_corrects"])):
-                g_wordidxs = TSVstring2list(
-                    line_dict["gene_wordidxss"][g_idx], int)
-                gene_mention = Mention(
-                    "GENE", line_dict["gene_entities"][g_idx],
-                    [sentence.words[j] for j in g_wordidxs])
-                if line_dict["gene_is_corrects"][g_idx] == "n":
-                    gene_mention.is_correct = None
-                elif line_dict["gene_is_corrects"][g_idx] == "f":
-                    gene_mention.is_correct = False
-                elif line_dict["gene_is_corrects"][g_idx] == "t":
-                    gene_mention.is_correct = True
-                else:
-                    assert False
-                gene_mention.type = line_dict["gene_types"][g_idx]
-                assert not gene_mention.type.endswith("_UNSUP")
-                for h_idx in range(len(line_dict["hpoterm_is_corrects"])):
-                    h_wordidxs = TSVstring2list(
-                        line_dict["hpoterm_wordidxss"][h_idx], int)
-                    hpoterm_mention = Mention(
-                        "hpoterm", line_dict["hpoterm_entities"][h_idx],
-                        [sentence.words[j] for j in h_wordidxs])
-                    if line_dict["hpoterm_is_corrects"][h_idx] == "n":
-                        hpoterm_mention.is_correct = None
-                    elif line_dict["hpoterm_is_corrects"][h_idx] == "f":
-                        hpoterm_mention.is_correct = False
-                    elif line_dict["hpoterm_is_corrects"][h_idx] == "t":
-                        hpoterm_mention.is_correct = True
-                    else:
-                        assert False
-                    hpoterm_mention.type = line_dict["hpoterm_types"][h_idx]
-                    assert not hpoterm_mention.type.endswith("_UNSUP")
-                    # Skip if the word indexes overlab
-                    if set(g_wordidxs) & set(h_wordidxs):
-                        continue
-                    # Skip if the mentions are too far away
-                    gene_start = gene_mention.wordidxs[0]
-                    hpoterm_start = hpoterm_mention.wordidxs[0]
-                    gene_end = gene_mention.wordidxs[-1]
-                    hpoterm_end = hpoterm_mention.wordidxs[-1]
-                    limits = sorted(
-                        (gene_start, hpoterm_start, gene_end, hpoterm_end))
-                    start = limits[0]
-                    betw_start = limits[1]
-                    betw_end = limits[2]
-                    if betw_end - betw_start > 50:
-                        continue
-                    relation = Relation(
-                        "GENEHPOTERM", gene_mention, hpoterm_mention)
-                    # Add features
-                    add_features(relation, gene_mention, hpoterm_mention,
-                                 sentence)
-                    # Supervise
-                    supervise(relation, gene_mention, hpoterm_mention,
-                              sentence)
-                    # Print!
-                    print(relation.tsv_dump())
+    run_extractor(decoder, process)
@@ -1,5 +1,17 @@
 #! /usr/bin/env python3
 
+import gc
+import hashlib
+import operator
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+
+from dstruct.HPODag import HPODag
+from dstruct.MappedDict import MappedDict
+from dstruct.PhraseTrie import PhraseTrie
 from helper.easierlife import BASE_DIR
 
 
@@ -33,6 +45,17 @@ def load_merged_genes_dictionary(filename):
     return merged_genes_dict
 
 
+# Load the maximum number of words of the entries of the merged genes
+# dictionary
+def load_merged_genes_max_length(filename):
+    max_length = 0
+    for key in load_merged_genes_dictionary(filename):
+        length = len(key.split())
+        if length > max_length:
+            max_length = length
+    return max_length
+
+
 # Load the genes dictionary
 def load_genes_dictionary(filename):
     genes_dict = dict()
@@ -108,6 +131,28 @@ def load_hpoterms_in_genes_dictionary(filename):
     return hpoterms_in_genes_dict
 
 
+# Flags for the values in the trie of the gene phrases
+PHRASE_IS_HPOTERM_WITH_GENE = 1
+PHRASE_IS_GENE = 2
+
+
+# Load the trie of all the phrases that give origin to a gene mention
+# candidate (see extract_gene_mentions.py), with the PHRASE_IS_* flags of each
+# phrase as value: the HPO terms containing a gene name, and the entries of
+# the merged genes dictionary, except those of one character. 'filenames' is
+# the pair of the merged genes and the genes in HPO terms dictionaries.
+def load_gene_phrases_trie(filenames):
+    merged_genes_filename, genes_in_hpoterms_filename = filenames
+    phrases_trie = PhraseTrie()
+    for phrase in load_hpoterms_with_gene_dictionary(
+            genes_in_hpoterms_filename):
+        phrases_trie.add(phrase, PHRASE_IS_HPOTERM_WITH_GENE, operator.or_)
+    for phrase in load_merged_genes_dictionary(merged_genes_filename):
+        if len(phrase) > 1:
+            phrases_trie.add(phrase, PHRASE_IS_GENE, operator.or_)
+    return phrases_trie
+
+
 def load_genes_with_hpoterm_dictionary(filename):
     genes_with_hpoterm_dict = dict()
     with open(filename, 'rt') as dict_file:
@@ -117,66 +162,66 @@ def load_genes_with_hpoterm_dictionary(filename):
     return genes_with_hpoterm_dict
 
 
-# Load the HPO term levels
+# Load the set of the tokens that can be the first word of a gene long name
+# containing an HPO term name: the prefixes of the names ending before a space
+def load_genes_with_hpoterm_first_tokens(filename):
+    return frozenset(
+        name[:i] for name in load_genes_with_hpoterm_dictionary(filename)
+        for i in range(len(name) + 1) if i == len(name) or name[i] == " ")
+
+
+# Load the HPO DAG
+def load_hpodag(filename):
+    return HPODag(filename)
+
+
+# Load the HPO term levels. The level of a term is the length of the shortest
+# path from the root ('All', which is at level 1) to the term.
 def load_hpoterm_levels_dictionary(filename):
+    hpodag = load_hpodag(filename)
     hpo_level_dict = dict()
-    with open(filename, 'rt') as hpo_level_dict_file:
-        for line in hpo_level_dict_file:
-            hpo_id, name, c, level = line.strip().split("\t")
-            level = int(level)
-            if level not in hpo_level_dict:
-                hpo_level_dict[level] = set()
-            hpo_level_dict[level].add(hpo_id)
+    for hpo_id in hpodag.ids:
+        level = hpodag.depth(hpo_id) + 1
+        if level not in hpo_level_dict:
+            hpo_level_dict[level] = set()
+        hpo_level_dict[level].add(hpo_id)
     return hpo_level_dict
 
 
 # Load the HPO parents
 def load_hpoparents_dictionary(filename):
+    hpodag = load_hpodag(filename)
     hpoparents_dict = dict()
-    with open(filename, 'rt') as hpoparents_dict_file:
-        for line in hpoparents_dict_file:
-            child, is_a, parent = line.strip().split("\t")
-            if child not in hpoparents_dict:
-                hpoparents_dict[child] = set()
-            hpoparents_dict[child].add(parent)
+    for hpo_id in hpodag.ids:
+        parents = hpodag.parents(hpo_id)
+        if parents:
+            hpoparents_dict[hpo_id] = parents
     # Add 'All'
-    hpoparents_dict["HP:0000001"] = set(["HP:0000001", ])
+    hpoparents_dict[HPODag.ROOT] = set([HPODag.ROOT, ])
     return hpoparents_dict
 
 
 # Load the HPO ancestors
 def load_hpoancestors_dictionary(filename):
-    hpoparents_dict = load_hpoparents_dictionary(filename)
-
-    def get_ancestors(key):
-        if hpoparents_dict[key] == set([key, ]):
-            return hpoparents_dict[key]
-        else:
-            parents = hpoparents_dict[key]
-            ancestors = set(parents)
-            for parent in parents:
-                ancestors |= get_ancestors(parent)
-            return ancestors
+    hpodag = load_hpodag(filename)
     hpoancestors_dict = dict()
-    with open(filename, 'rt') as hpoancestors_dict_file:
-        for line in hpoancestors_dict_file:
-            child, is_a, parent = line.strip().split("\t")
-            if child not in hpoancestors_dict:
-                hpoancestors_dict[child] = get_ancestors(child)
+    for hpo_id in hpodag.ids:
+        ancestors = hpodag.ancestors(hpo_id)
+        if ancestors:
+            hpoancestors_dict[hpo_id] = ancestors
     # Add 'All'
-    hpoancestors_dict["HP:0000001"] = set(["HP:0000001", ])
+    hpoancestors_dict[HPODag.ROOT] = set([HPODag.ROOT, ])
     return hpoancestors_dict
 
 
 # Load the HPO children
 def load_hpochildren_dictionary(filename):
+    hpodag = load_hpodag(filename)
     hpochildren_dict = dict()
-    with open(filename, 'rt') as hpochildren_dict_file:
-        for line in hpochildren_dict_file:
-            child, is_a, parent = line.strip().split("\t")
-            if parent not in hpochildren_dict:
-                hpochildren_dict[parent] = set()
-            hpochildren_dict[parent].add(child)
+    for hpo_id in hpodag.ids:
+        children = hpodag.children(hpo_id)
+        if children:
+            hpochildren_dict[hpo_id] = children
     return hpochildren_dict
 
 
@@ -216,6 +261,24 @@ def load_hpoterms_dictionary(filename):
     return _hpoterms_dict
 
 
+# Load the index of the HPOterms 'mentions' dictionary
+# Maps each stem to the stem sets (keys of the 'hpoterms' dictionary)
+# containing it
+def load_hpoterms_stem_index_dictionary(filename):
+    stem_index = dict()
+    with open(filename, 'rt') as _hpoterms_dict_file:
+        for line in _hpoterms_dict_file:
+            hpoterm_id, name, stems = line[:-1].split("\t")
+            stems_set = frozenset(stems.split("|"))
+            for stem in stems_set:
+                if stem not in stem_index:
+                    stem_index[stem] = set()
+                stem_index[stem].add(stems_set)
+    for stem in stem_index:
+        stem_index[stem] = frozenset(stem_index[stem])
+    return stem_index
+
+
 # Load the inverted HPOterms 'mentions' dictionary
 # Map hpo names to stem sets
 def load_hpoterms_inverted_dictionary(filename):
@@ -270,6 +333,29 @@ def load_set_lower_case(filename):
     return lower_case_set
 
 
+# Load the table of the stems of the vocabulary (see build_stem_table.py)
+# Each line is 'token<TAB>stem', where an empty stem means that the stem is the
+# token itself.
+def load_stems_dictionary(filename):
+    stems = dict()
+    with open(filename, 'rt') as stems_file:
+        for line in stems_file:
+            token, stem = line[:-1].split("\t")
+            stems[token] = stem if stem else token
+    return stems
+
+
+# Load the set of the tokens in the table of the stems whose stem is the stem
+# of a word of an HPO term name. 'filenames' is the pair of the table of the
+# stems and the HPO terms dictionary.
+def load_hpoterm_tokens(filenames):
+    stems_filename, hpoterms_filename = filenames
+    stem_index = load_hpoterms_stem_index_dictionary(hpoterms_filename)
+    return frozenset(
+        token for token, stem in load_stems_dictionary(stems_filename).items()
+        if stem in stem_index)
+
+
 # Load a dictionary which is a set of pairs, where the pairs are frozensets
 def load_set_pairs(filename):
     pair_set = set()
@@ -297,20 +383,24 @@ MERGED_GENES_DICT_FILENAME = BASE_DIR + "/dicts/merged_genes_dict.tsv"
 NIH_GRANTS_DICT_FILENAME = BASE_DIR + "/dicts/grant_codes_nih.tsv"
 NSF_GRANTS_DICT_FILENAME = BASE_DIR + "/dicts/grant_codes_nsf.tsv"
 STOPWORDS_DICT_FILENAME = BASE_DIR + "/dicts/english_stopwords.tsv"
+STEMS_DICT_FILENAME = BASE_DIR + "/dicts/stems.tsv"
 POS_GENE_MENTIONS_DICT_FILENAME = BASE_DIR + \
     "/dicts/positive_gene_mentions.tsv"
 NEG_GENE_MENTIONS_DICT_FILENAME = BASE_DIR + \
     "/dicts/negative_gene_mentions.tsv"
 
-# Dictionary of dictionaries. First argument is the filename, second is the
-# function to call to load the dictionary. The function must take the filename
-# as input and return an object like a dictionary, or a set, or a list, ...
+# Dictionary of dictionaries. First argument is the filename (or a tuple of
+# filenames), second is the function to call to load the dictionary. The
+# function must take the filename (or the tuple) as input and return an object
+# like a dictionary, or a set, or a list, ...
 dictionaries = dict()
 dictionaries["genes"] = [GENES_DICT_FILENAME, load_genes_dictionary]
 dictionaries["genes_in_hpoterms"] = [GENES_IN_HPOTERMS_DICT_FILENAME,
                                      load_genes_in_hpoterms_dictionary]
 dictionaries["genes_with_hpoterm"] = [HPOTERMS_IN_GENES_DICT_FILENAME,
                                       load_genes_with_hpoterm_dictionary]
+dictionaries["genes_with_hpoterm_first_tokens"] = [
+    HPOTERMS_IN_GENES_DICT_FILENAME, load_genes_with_hpoterm_first_tokens]
 dictionaries["english"] = [ENGLISH_DICT_FILENAME, load_set_lower_case]
 dictionaries["genehpoterms"] = [GENEHPOTERM_DICT_FILENAME, load_set_pairs]
 dictionaries["hpoparents"] = [HPOPARENTS_DICT_FILENAME,
@@ -319,11 +409,14 @@ dictionaries["hpoancestors"] = [HPOPARENTS_DICT_FILENAME,
                                 load_hpoancestors_dictionary]
 dictionaries["hpochildren"] = [HPOPARENTS_DICT_FILENAME,
                                load_hpochildren_dictionary]
-dictionaries["hpolevels"] = [HPOTERMS_ORIG_DICT_FILENAME,
+dictionaries["hpodag"] = [HPOPARENTS_DICT_FILENAME, load_hpodag]
+dictionaries["hpolevels"] = [HPOPARENTS_DICT_FILENAME,
                              load_hpoterm_levels_dictionary]
 dictionaries["hponames_to_ids"] = [HPOTERMS_DICT_FILENAME,
                                    load_hponames_to_ids_dictionary]
 dictionaries["hpoterms"] = [HPOTERMS_DICT_FILENAME, load_hpoterms_dictionary]
+dictionaries["hpoterms_stem_index"] = [HPOTERMS_DICT_FILENAME,
+                                      load_hpoterms_stem_index_dictionary]
 dictionaries["hpoterms_inverted"] = [HPOTERMS_DICT_FILENAME,
                                      load_hpoterms_inverted_dictionary]
 dictionaries["hpoterm_phenotype_abnormalities"] = [
@@ -340,22 +433,185 @@ dictionaries["med_acrons"] = [MED_ACRONS_DICT_FILENAME,
                               load_medacrons_dictionary]
 dictionaries["merged_genes"] = [MERGED_GENES_DICT_FILENAME,
                                 load_merged_genes_dictionary]
+dictionaries["merged_genes_max_length"] = [MERGED_GENES_DICT_FILENAME,
+                                           load_merged_genes_max_length]
 dictionaries["long_names"] = [MERGED_GENES_DICT_FILENAME,
                               load_long_names_dictionary]
 dictionaries["inverted_long_names"] = [MERGED_GENES_DICT_FILENAME,
                                        load_inverted_long_names_dictionary]
+dictionaries["gene_phrases_trie"] = [
+    (MERGED_GENES_DICT_FILENAME, GENES_IN_HPOTERMS_DICT_FILENAME),
+    load_gene_phrases_trie]
 dictionaries["stopwords"] = [STOPWORDS_DICT_FILENAME, load_set]
+dictionaries["stems"] = [STEMS_DICT_FILENAME, load_stems_dictionary]
+dictionaries["hpoterm_tokens"] = [
+    (STEMS_DICT_FILENAME, HPOTERMS_DICT_FILENAME), load_hpoterm_tokens]
 dictionaries["pos_gene_mentions"] = [POS_GENE_MENTIONS_DICT_FILENAME,
                                      load_examples_dictionary]
 dictionaries["neg_gene_mentions"] = [NEG_GENE_MENTIONS_DICT_FILENAME,
                                      load_examples_dictionary]
 
 
-# Load a dictionary using the appropriate filename and load function
-def load_dict(dict_name):
+# Directory containing the snapshots of the loaded dictionaries. A snapshot is
+# a pickled copy of the object returned by the load function, so that it can be
+# loaded without parsing the dictionary file again.
+SNAPSHOTS_DIR = os.environ.get("DICTS_SNAPSHOTS_DIR",
+                               BASE_DIR + "/dicts/snapshots")
+# Increase this to invalidate all existing snapshots
+SNAPSHOTS_VERSION = 1
+# If True, load_dict() returns the dictionaries as read-only memory-mapped
+# objects (see dstruct/MappedDict.py) whenever possible, so that the processes
+# running on the same machine share a single copy of them.
+SHARED_DICTS = os.environ.get("SHARED_DICTS", "0") not in ("", "0")
+
+
+# Return the names of the modules defining the classes used by 'module', i.e.,
+# of the classes in its namespace, other than the builtins
+def get_class_modules(module):
+    names = set()
+    for value in vars(module).values():
+        if isinstance(value, type) and value.__module__ != module.__name__ \
+                and getattr(sys.modules.get(value.__module__), "__file__",
+                            None):
+            names.add(value.__module__)
+    return sorted(names)
+
+
+# Return a string identifying the contents of the dictionary file (or files,
+# if 'filename' is a tuple) and the load function. If any of them changes, so
+# does the key, and the snapshot must be rebuilt.
+def get_snapshot_key(filename, load):
+    key_fields = [str(SNAPSHOTS_VERSION), sys.version]
+    filenames = filename if isinstance(filename, tuple) else (filename,)
+    for filename in filenames:
+        file_stat = os.stat(filename)
+        key_fields.extend([os.path.realpath(filename),
+                           str(file_stat.st_mtime_ns),
+                           str(file_stat.st_size)])
+    key_fields.append(load.__qualname__)
+    # Changes to the module containing the load function (i.e., to the load
+    # function or to any function it calls) invalidate the snapshot, and so
+    # do changes to the modules of the classes it uses, as their objects
+    # (e.g., the HPODag) are pickled with their internal layout.
+    for module_name in [load.__module__] + \
+            get_class_modules(sys.modules[load.__module__]):
+        module_stat = os.stat(sys.modules[module_name].__file__)
+        key_fields.extend([module_name, str(module_stat.st_mtime_ns),
+                           str(module_stat.st_size)])
+    key = "\t".join(key_fields)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+# Return the object stored in the snapshot with the given key, or None if the
+# snapshot does not exist or is stale.
+def read_snapshot(snapshot_filename, key):
+    gc_was_enabled = gc.isenabled()
+    try:
+        with open(snapshot_filename, 'rb') as snapshot_file:
+            # The key is pickled first, so we can check it without unpickling
+            # the whole dictionary
+            if pickle.load(snapshot_file) != key:
+                return None
+            # Unpickling creates a lot of objects, none of them garbage, so
+            # running the garbage collector meanwhile is only a waste of time.
+            gc.disable()
+            return pickle.load(snapshot_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError):
+        # AttributeError and ImportError: a class of the pickled objects was
+        # renamed or removed
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+# Write the snapshot. The file is written to a temporary file and then renamed,
+# so that processes loading the same dictionary at the same time never see a
+# partially written snapshot. Failures (e.g., a read-only directory) are not
+# fatal: the dictionary will just be parsed again next time.
+def write_snapshot(snapshot_filename, key, obj):
+    try:
+        os.makedirs(os.path.dirname(snapshot_filename), exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(snapshot_filename), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                pickle.dump(key, tmp_file, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(obj, tmp_file, pickle.HIGHEST_PROTOCOL)
+            # mkstemp() creates the file readable only by the owner
+            os.chmod(tmp_filename, 0o644)
+            os.replace(tmp_filename, snapshot_filename)
+        except:
+            os.remove(tmp_filename)
+            raise
+    except OSError:
+        pass
+
+
+# Return the pair (mapped, obj), where 'mapped' is the memory-mapped version
+# of the dictionary, built if it does not exist or is stale, or None if the
+# dictionary cannot be memory-mapped (e.g., it has non-string keys). 'obj' is
+# the dictionary loaded with load_obj() if it had to be loaded (so that the
+# caller does not load it again), or None.
+def load_mapped_dict(dict_name, key, load_obj):
+    mapped_filename = os.path.join(SNAPSHOTS_DIR, dict_name + ".map")
+    try:
+        return (MappedDict(mapped_filename, key), None)
+    except (OSError, ValueError):
+        pass
+    obj = load_obj()
+    try:
+        MappedDict.get_kind(obj)
+    except TypeError:
+        return (None, obj)
+    try:
+        os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+        MappedDict.build(mapped_filename, obj, key)
+        return (MappedDict(mapped_filename, key), None)
+    except (OSError, ValueError):
+        return (None, obj)
+
+
+# Load a dictionary using the appropriate filename and load function.
+# If 'snapshot' is True, use the snapshot of the dictionary if it is up to
+# date, otherwise load the dictionary and create the snapshot.
+# If 'shared' is True (default: SHARED_DICTS) and the dictionary has string
+# keys, return a read-only memory-mapped version of the dictionary, which is
+# shared by all the processes using it. Lookups return the same values as the
+# original dictionary, except that sets are returned as frozensets.
+def load_dict(dict_name, snapshot=True, shared=None):
     filename = dictionaries[dict_name][0]
     load = dictionaries[dict_name][1]
-    return load(filename)
+    if shared is None:
+        shared = SHARED_DICTS
+    if not snapshot and not shared:
+        return load(filename)
+    key = get_snapshot_key(filename, load)
+
+    def load_obj():
+        if not snapshot:
+            return load(filename)
+        snapshot_filename = os.path.join(SNAPSHOTS_DIR, dict_name + ".pickle")
+        obj = read_snapshot(snapshot_filename, key)
+        if obj is None:
+            obj = load(filename)
+            write_snapshot(snapshot_filename, key, obj)
+        # The dictionaries are kept until the end of the process: move them
+        # (and all the objects created so far) out of the reach of the garbage
+        # collector, which would otherwise go through all of them at each
+        # full collection
+        if hasattr(gc, "freeze"):  # Python 3.7+
+            gc.freeze()
+        return obj
+
+    if shared:
+        mapped, obj = load_mapped_dict(dict_name, key, load_obj)
+        if mapped is not None:
+            return mapped
+        if obj is not None:
+            return obj
+    return load_obj()
 
 
 # Given a list of words, return a list of variants built by splitting words
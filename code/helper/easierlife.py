@@ -72,6 +72,20 @@ def TSVstring2bool(string):
         return None
 
 
+# Given the keys of the mentions of a sentence (e.g., their word indexes) and
+# whether each of them is supervised (True), an unsupervised copy (False), or
+# to be dropped (None), return the list of the indexes of the mentions to keep,
+# in increasing order: the supervised mentions, and the unsupervised copies
+# whose key is not the key of any supervised mention. The mentions are grouped
+# by key in a set, so this runs in linear time.
+def dedup_unsupervised_copies(keys, supervised):
+    supervised_keys = set(
+        key for key, is_supervised in zip(keys, supervised) if is_supervised)
+    return [i for i, (key, is_supervised) in enumerate(zip(keys, supervised))
+            if is_supervised or
+            (is_supervised is False and key not in supervised_keys)]
+
+
 # Transform a string obtained by postgresql array_str() into a list.
 # The parameter func() gets applied to the elements of the list
 def TSVstring2list(string, func=(lambda x: x), sep="|^|"):
@@ -95,18 +109,21 @@ def TSVstring2dict(string, func=(lambda x: x), sep="|^^"):
 # Convert a list to a string that can be used in a TSV column and intepreted as
 # an array by the PostreSQL COPY FROM command.
 # If 'quote' is True, then double quote the string representation of the
-# elements of the list, and escape double quotes and backslashes.
+# elements of the list, and escape double quotes and backslashes. The list is
+# not modified.
 def list2TSVarray(a_list, quote=False):
-    if quote:
-        for index in range(len(a_list)):
-            if "\\" in str(a_list[index]):
-                # Replace '\' with '\\\\"' to be accepted by COPY FROM
-                a_list[index] = str(a_list[index]).replace("\\", "\\\\\\\\")
-            # This must happen the previous substitution
-            if "\"" in str(a_list[index]):
-                # Replace '"' with '\\"' to be accepted by COPY FROM
-                a_list[index] = str(a_list[index]).replace("\"", "\\\\\"")
-        string = ",".join(list(map(lambda x: "\"" + str(x) + "\"", a_list)))
-    else:
-        string = ",".join(list(map(lambda x: str(x), a_list)))
-    return "{" + string + "}"
+    strings = [str(x) for x in a_list]
+    if not quote:
+        return "{" + ",".join(strings) + "}"
+    if not strings:
+        return "{}"
+    # Most of the times there is nothing to escape, and we can check it on all
+    # the elements at once.
+    all_strings = "".join(strings)
+    if "\\" in all_strings or "\"" in all_strings:
+        strings = [x.translate(_TSV_ARRAY_ESCAPES) for x in strings]
+    return "{\"" + "\",\"".join(strings) + "\"}"
+
+
+# Replace '\' with '\\\\' and '"' with '\\"' to be accepted by COPY FROM
+_TSV_ARRAY_ESCAPES = str.maketrans({"\\": "\\\\\\\\", "\"": "\\\\\""})
@@ -0,0 +1,164 @@
+#! /usr/bin/env python3
+""" Serial or parallel execution of the extractors
+
+run_extractor() reads the input of an extractor (the files given on the
+command line, or the standard input), decodes each line, and writes the output
+lines returned by the extractor for the row.
+
+With --workers N (N > 1), the input is read in chunks of lines, which are
+decoded and processed by N worker processes. The workers are forked from the
+extractor, after the dictionaries have been loaded, so they share them. The
+output of the chunks is written in the order of the input, so it is the same
+as with a single process, and at most 2 * N chunks are in flight at any time,
+so that the input is not read much faster than it is processed.
+
+The extractor can give a prefilter, a function called on each raw input line,
+returning False if the line cannot give any output, in which case it is not
+decoded nor processed at all. The number of lines skipped is reported on the
+standard error at the end.
+
+The extractors that work on groups of rows (e.g., on the sentences of a
+document) can have run_extractor() group the consecutive rows with the same
+value in a column, instead of aggregating them into a single row in SQL.
+"""
+
+import argparse
+import collections
+import fileinput
+import itertools
+import multiprocessing
+import operator
+import sys
+
+from helper.tsv import TSVWriter
+
+# Number of lines in a chunk of the input given to a worker
+CHUNK_SIZE = 256
+
+# The arguments of run_extractor(), set before the workers are forked
+_decoder = None
+_process = None
+_prefilter = None
+_group_by = None
+
+
+# Return the parser of the command line of an extractor: the input files, and
+# the number of worker processes. The extractor can add its own options.
+def get_arg_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="number of worker processes (default: 1, no workers)")
+    parser.add_argument(
+        "files", nargs="*", help="input files (default: standard input)")
+    return parser
+
+
+# Yield the output lines returned by 'process' for each row, or for each group
+# of consecutive rows with the same value in the column 'group_by', if given
+def _process_rows(rows, process, group_by):
+    if group_by is None:
+        for row in rows:
+            yield from process(row)
+    else:
+        for key, group in itertools.groupby(rows,
+                                            operator.attrgetter(group_by)):
+            yield from process(group)
+
+
+# Decode and process a chunk of lines: (filename, number of the first line,
+# list of lines). Return the list of the output lines and the number of lines
+# skipped by the prefilter. Run in the workers.
+def _process_chunk(chunk):
+    filename, start, lines = chunk
+    skipped = _decoder.skipped
+    output = list(_process_rows(
+        _decoder.decode_lines(lines, filename, start, _prefilter), _process,
+        _group_by))
+    return (output, _decoder.skipped - skipped)
+
+
+# Yield the chunks of the lines of 'input_files' (a fileinput.FileInput). A
+# chunk does not span two files. If 'group_index' is given, a chunk is not
+# split between two lines with the same value in the field at that index.
+def _read_chunks(input_files, chunk_size, group_index=None):
+    lines = []
+    key = None
+    # The name of the file and the number of the first line of the chunk
+    filename = None
+    start = 0
+    for line in input_files:
+        if group_index is not None:
+            prev_key = key
+            key = line.split("\t", group_index + 1)[group_index]
+        if lines and (input_files.isfirstline() or
+                      (len(lines) >= chunk_size and
+                       (group_index is None or key != prev_key))):
+            yield (filename, start, lines)
+            lines = []
+        if not lines:
+            filename = input_files.filename()
+            start = input_files.filelineno()
+        lines.append(line)
+    if lines:
+        yield (filename, start, lines)
+
+
+# Run an extractor: decode each line of the input with 'decoder', call
+# 'process' on the row, which returns the list of the output lines, and write
+# them to the standard output. The lines for which 'prefilter' (if given)
+# returns False are skipped. If 'group_by' is the name of a column, 'process'
+# is called instead on each group of consecutive rows with the same value in
+# that column (e.g., the sentences of a document), given as an iterator, so
+# that the rows of a group are not all kept in memory. With workers, a group
+# must not span two input files. 'args' are the parsed command line arguments
+# (default: parsed with get_arg_parser()).
+def run_extractor(decoder, process, prefilter=None, group_by=None, args=None,
+                  chunk_size=CHUNK_SIZE):
+    global _decoder, _process, _prefilter, _group_by
+    if args is None:
+        args = get_arg_parser().parse_args()
+    # Number of lines read and skipped by the prefilter
+    num_lines = 0
+    skipped = 0
+    with fileinput.input(files=args.files) as input_files, \
+            TSVWriter() as writer:
+        if args.workers <= 1:
+            rows = decoder.decode_lines(input_files, prefilter=prefilter)
+            for line in _process_rows(rows, process, group_by):
+                writer.write(line)
+            num_lines = input_files.lineno()
+            skipped = decoder.skipped
+        else:
+            _decoder = decoder
+            _process = process
+            _prefilter = prefilter
+            _group_by = group_by
+            group_index = None
+            if group_by is not None:
+                group_index = decoder.names.index(group_by)
+            context = multiprocessing.get_context("fork")
+            with context.Pool(args.workers) as pool:
+                # The results of the chunks being processed, in input order
+                pending = collections.deque()
+                for chunk in _read_chunks(input_files, chunk_size,
+                                          group_index):
+                    pending.append(pool.apply_async(_process_chunk, (chunk,)))
+                    num_lines += len(chunk[2])
+                    if len(pending) >= 2 * args.workers:
+                        skipped += _write_chunk(writer, pending.popleft())
+                while pending:
+                    skipped += _write_chunk(writer, pending.popleft())
+    if prefilter is not None and num_lines > 0:
+        sys.stderr.write("{}: {} of {} lines ({:.1f}%) skipped by the "
+                         "prefilter\n".format(sys.argv[0], skipped, num_lines,
+                                               100.0 * skipped / num_lines))
+
+
+# Write the output lines of a chunk processed by a worker, and return the
+# number of lines skipped by the prefilter
+def _write_chunk(writer, result):
+    output, skipped = result.get()
+    for line in output:
+        writer.write(line)
+    return skipped
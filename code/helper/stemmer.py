@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+""" Stemming of the tokens of the sentences
+
+The stems of the vocabulary (English words, words of the HPO names, and words
+of the corpus) are precomputed by build_stem_table.py into dicts/stems.tsv. The
+stems of the tokens that are not in the table are computed with the NLTK
+Snowball stemmer and kept in a bounded LRU cache. NLTK is imported only the
+first time that a token is not found in the table.
+"""
+
+import functools
+
+from helper.dictionaries import load_dict
+
+
+class Stemmer(object):
+
+    # 'table' maps tokens to their stems. At most 'cache_size' stems of the
+    # tokens that are not in the table are cached.
+    def __init__(self, table, cache_size=1 << 16):
+        self.table = table
+        self._snowball = None
+        self._stem_unseen = functools.lru_cache(maxsize=cache_size)(
+            self._stem_with_nltk)
+
+    def _stem_with_nltk(self, token):
+        if self._snowball is None:
+            from nltk.stem.snowball import SnowballStemmer
+            self._snowball = SnowballStemmer("english")
+        return self._snowball.stem(token)
+
+    def stem(self, token):
+        stem = self.table.get(token)
+        if stem is None:
+            stem = self._stem_unseen(token)
+        return stem
+
+    # Return the list of the stems of the tokens
+    def stem_all(self, tokens):
+        get = self.table.get
+        stem_unseen = self._stem_unseen
+        stems = []
+        for token in tokens:
+            stem = get(token)
+            if stem is None:
+                stem = stem_unseen(token)
+            stems.append(stem)
+        return stems
+
+    # Return the (hits, misses, maxsize, currsize) statistics of the cache of
+    # the stems of the tokens that are not in the table
+    def cache_info(self):
+        return self._stem_unseen.cache_info()
+
+
+# Return a Stemmer using the precomputed stem table, if it has been built
+def load_stemmer(cache_size=1 << 16):
+    try:
+        table = load_dict("stems")
+    except FileNotFoundError:
+        table = dict()
+    return Stemmer(table, cache_size)
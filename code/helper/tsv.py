@@ -0,0 +1,209 @@
+#! /usr/bin/env python3
+""" Decoding of the TSV input and encoding of the TSV output of the extractors
+
+A TSVDecoder is compiled once from the schema of the input (the list of the
+columns, with their types) into a function that splits a TSV line and converts
+all its fields in one go, returning a named tuple. Columns that the caller does
+not use are not decoded at all.
+
+A TSVWriter encodes the output lines to bytes and writes them to the binary
+standard output in large batches, instead of going through the line-buffered
+text standard output with print().
+"""
+
+import collections
+import sys
+
+# Default separator of the elements of an array column (see
+# helper.easierlife.TSVstring2list())
+ARRAY_SEP = "|^|"
+
+# The columns of a sentence, in the order of the arguments of
+# dstruct.Sentence.Sentence()
+SENTENCE_COLUMNS = [
+    ("doc_id", "text"), ("sent_id", "int"), ("wordidxs", "int[]"),
+    ("words", "text[]"), ("poses", "text[]"), ("ners", "text[]"),
+    ("lemmas", "text[]"), ("dep_paths", "text[]"), ("dep_parents", "int[]"),
+    ("bounding_boxes", "text[]")]
+
+# For each type of column, the expression converting the field 'f' to a value
+# of that type. 'sep' is the separator of the elements of an array.
+_CONVERSIONS = {
+    "text": "{f}",
+    "int": "int({f})",
+    "bool": "_BOOLS.get({f})",
+    "text[]": "{f}.split({sep!r})",
+    "int[]": "list(map(int, {f}.split({sep!r})))",
+}
+
+# See helper.easierlife.TSVstring2bool()
+_BOOLS = {"t": True, "f": False}
+
+
+class MalformedRowError(ValueError):
+    pass
+
+
+class TSVDecoder(object):
+
+    # 'columns' is a list of (name, type) or (name, type, sep) tuples, where
+    # 'type' is one of the keys of _CONVERSIONS, and 'sep' is the separator
+    # of the elements of an array column (default: ARRAY_SEP).
+    # 'used' is the collection of the names of the columns actually used by
+    # the caller (default: all). The other columns are not decoded, and their
+    # value in the rows is None.
+    def __init__(self, columns, used=None):
+        self.names = []
+        self.conversions = []
+        for column in columns:
+            name = column[0]
+            column_type = column[1]
+            sep = column[2] if len(column) > 2 else ARRAY_SEP
+            if column_type not in _CONVERSIONS:
+                raise ValueError("Unknown type {} for column {}".format(
+                    column_type, name))
+            self.names.append(name)
+            self.conversions.append(
+                _CONVERSIONS[column_type].format(f="f{}".format(
+                    len(self.names) - 1), sep=sep))
+        if used is None:
+            used = self.names
+        for name in used:
+            if name not in self.names:
+                raise ValueError("Unknown column {}".format(name))
+        self.used = [name in used for name in self.names]
+        self.row_type = collections.namedtuple("Row", self.names)
+        self.decode = self._compile()
+        # Number of malformed rows found by decode_lines(), and of lines
+        # skipped by its prefilter
+        self.malformed = 0
+        self.skipped = 0
+
+    # Generate the source code of the decoding function and compile it. An
+    # empty field is NULL and is decoded as None. The line is split only up to
+    # the last used column: the unused columns following it are left in a
+    # single string, in which we only count the tabs.
+    def _compile(self):
+        num_columns = len(self.names)
+        num_fields = num_columns
+        while num_fields > 1 and not self.used[num_fields - 1]:
+            num_fields -= 1
+        fields = ["f{}".format(i) for i in range(num_fields)]
+        values = []
+        for i in range(num_columns):
+            if i < num_fields and self.used[i]:
+                values.append("({} if {} else None)".format(
+                    self.conversions[i], fields[i]))
+            else:
+                values.append("None")
+        if num_fields == num_columns:
+            source = [
+                "def decode(line):",
+                "    fields = line.rstrip('\\n').split('\\t')",
+                "    if len(fields) != {}:".format(num_columns),
+                "        raise MalformedRowError(_count_error(fields))",
+                "    {}, = fields".format(", ".join(fields)),
+            ]
+        else:
+            source = [
+                "def decode(line):",
+                "    fields = line.split('\\t', {})".format(num_fields),
+                "    if len(fields) != {} or \\".format(num_fields + 1),
+                "            fields[-1].count('\\t') != {}:".format(
+                    num_columns - num_fields - 1),
+                "        raise MalformedRowError(_count_error(fields))",
+                "    {}, rest = fields".format(", ".join(fields)),
+            ]
+        source += [
+            "    try:",
+            "        return _new_row(_Row, ({},))".format(", ".join(values)),
+            "    except (ValueError, TypeError) as error:",
+            "        raise MalformedRowError(_find_error(fields)) from error",
+        ]
+        namespace = {
+            "MalformedRowError": MalformedRowError, "_BOOLS": _BOOLS,
+            "_Row": self.row_type, "_new_row": tuple.__new__,
+            "_count_error": self._count_error, "_find_error": self._find_error}
+        exec(compile("\n".join(source), "<TSVDecoder>", "exec"), namespace)
+        return namespace["decode"]
+
+    # Return the description of a row with the wrong number of columns
+    def _count_error(self, fields):
+        return "expected {} columns, found {}".format(
+            len(self.names), "\t".join(fields).count("\t") + 1)
+
+    # Return the description of the first field that cannot be converted
+    def _find_error(self, fields):
+        for i, field in enumerate(fields):
+            if i >= len(self.names) or not self.used[i] or not field:
+                continue
+            try:
+                eval(self.conversions[i], {"_BOOLS": _BOOLS},
+                     {"f{}".format(i): field})
+            except (ValueError, TypeError) as error:
+                return "column {}: {}".format(self.names[i], error)
+        return "unknown error"
+
+    # Decode the lines, yielding a row for each of them. Malformed lines are
+    # reported on stderr and skipped. 'filename' and 'start' are the name of
+    # the file and the number of the first line, used in the reports. The
+    # lines for which 'prefilter' (if given) returns False are skipped
+    # without being decoded.
+    def decode_lines(self, lines, filename=None, start=1, prefilter=None):
+        decode = self.decode
+        for line_number, line in enumerate(lines, start):
+            if prefilter is not None and not prefilter(line):
+                self.skipped += 1
+                continue
+            try:
+                yield decode(line)
+            except MalformedRowError as error:
+                self.malformed += 1
+                # Use the position in the current file if lines is a
+                # fileinput.FileInput
+                if filename is not None:
+                    position = "{}:{}".format(filename, line_number)
+                else:
+                    try:
+                        position = "{}:{}".format(lines.filename(),
+                                                  lines.filelineno())
+                    except AttributeError:
+                        position = "line {}".format(line_number)
+                sys.stderr.write("{}: malformed row: {}\n".format(
+                    position, error))
+
+
+class TSVWriter(object):
+
+    # Lines are encoded to bytes using the encoding of the text standard
+    # output (so that the output is the same as with print()), and written
+    # when the buffer holds at least 'buffer_size' bytes.
+    def __init__(self, stream=None, buffer_size=1 << 16):
+        if stream is None:
+            sys.stdout.flush()
+            stream = sys.stdout.buffer
+        self.stream = stream
+        self.encoding = sys.stdout.encoding
+        self.errors = sys.stdout.errors
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    # Write a line (without the trailing newline)
+    def write(self, line):
+        buf = self._buffer
+        buf += line.encode(self.encoding, self.errors)
+        buf += b"\n"
+        if len(buf) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.stream.write(self._buffer)
+            self._buffer.clear()
+        self.stream.flush()
@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+#
+# Tests of the snapshots of the dictionaries (see helper/dictionaries.py)
+#
+# USAGE: python3 -m unittest test_dictionaries
+#
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from helper.dictionaries import load_dict
+from helper.tsv import ARRAY_SEP
+
+CODE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+# Return the TSV line of a sentence made of 'words', as in the sentences_input
+# table
+def make_sentence_line(doc_id, sent_id, words):
+    n = len(words)
+    return "\t".join([
+        doc_id, str(sent_id), ARRAY_SEP.join(str(i) for i in range(n)),
+        ARRAY_SEP.join(words), ARRAY_SEP.join(["NN"] * n),
+        ARRAY_SEP.join(["O"] * n),
+        ARRAY_SEP.join(word.lower() for word in words),
+        ARRAY_SEP.join(["dep"] * n), ARRAY_SEP.join(["-1"] * n), ""]) + "\n"
+
+
+class TestSnapshots(unittest.TestCase):
+
+    # Run 'extractor' on 'input_filename' with the snapshots in
+    # 'snapshots_dir' and the given hash seed, and return its output lines
+    # without the last column (the features, a set whose order depends on the
+    # hash seed)
+    def run_extractor(self, extractor, input_filename, snapshots_dir,
+                      hash_seed):
+        env = dict(os.environ, DICTS_SNAPSHOTS_DIR=snapshots_dir,
+                   PYTHONHASHSEED=hash_seed)
+        output = subprocess.run(
+            [sys.executable, os.path.join(CODE_DIR, extractor),
+             input_filename], env=env, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, check=True).stdout
+        return [line.rsplit(b"\t", 1)[0] for line in output.splitlines()]
+
+    # The HPO term mentions must not depend on whether the dictionaries are
+    # parsed (cold start) or loaded from the snapshots (warm start), nor on
+    # the hash seed, which changes the order of the sets. Each sentence
+    # contains an HPO term with the same stems as other HPO terms.
+    def test_hpoterm_mentions_cold_and_warm(self):
+        hpoterms = load_dict("hpoterms", snapshot=False)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_filename = os.path.join(tmp_dir, "sentences.tsv")
+            with open(input_filename, 'wt') as input_file:
+                sent_id = 0
+                for names in hpoterms.values():
+                    if len(names) < 2:
+                        continue
+                    words = ["Patients", "with"] + \
+                        min(names).split(" ") + ["were", "examined", "."]
+                    input_file.write(
+                        make_sentence_line("DOC", sent_id, words))
+                    sent_id += 1
+            outputs = []
+            for hash_seed in ["1", "2"]:
+                snapshots_dir = os.path.join(tmp_dir, "snapshots" + hash_seed)
+                for start in ["cold", "warm"]:
+                    outputs.append(self.run_extractor(
+                        "extract_hpoterm_mentions.py", input_filename,
+                        snapshots_dir, hash_seed))
+                self.assertTrue(os.listdir(snapshots_dir))
+        self.assertTrue(outputs[0])
+        for output in outputs[1:]:
+            self.assertEqual(output, outputs[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+#
+# Tests of the dependency path features (see dstruct/Sentence.py)
+#
+# USAGE: python3 -m unittest test_sentence
+#
+
+import unittest
+
+from dstruct.Mention import Mention
+from dstruct.Sentence import Sentence
+
+
+# Return a sentence of len(dep_parents) words, where the label on the edge to
+# each word is given by 'dep_paths'
+def make_sentence(dep_paths, dep_parents):
+    n = len(dep_parents)
+    words = ["w{}".format(i) for i in range(n)]
+    return Sentence("DOC", 0, list(range(n)), words, ["NN"] * n, ["O"] * n,
+                    words, dep_paths, dep_parents, ["empty"] * n)
+
+
+class TestDepPath(unittest.TestCase):
+
+    # The labels on the edges: the path between w0 and w2 has a single edge
+    # with a long label, the paths between the other words of the entities
+    # have at least two edges with short labels
+    DEP_PATHS = ["a_very_long_label", "a", "b", "c", "d", "e", "f"]
+
+    # Return the feature of the dependency path between the entities w0 w1
+    # and w2 w3, given the parents of w5 and w6
+    def dep_path(self, parent5, parent6):
+        sentence = make_sentence(self.DEP_PATHS,
+                                 [2, 4, 4, 4, -1, parent5, parent6])
+        entity1 = Mention("ENTITY", "E1", sentence.words[0:2])
+        entity2 = Mention("ENTITY", "E2", sentence.words[2:4])
+        return sentence.dep_path(entity1, entity2)
+
+    # The path with the fewest edges is returned, even if its feature is not
+    # the shortest
+    def test_well_formed_tree(self):
+        self.assertEqual(self.dep_path(-1, -1), "a_very_long_label@")
+
+    # The same path is returned when the tree is malformed (w5 and w6 form a
+    # cycle) and the paths are computed by walking the tree
+    def test_malformed_tree(self):
+        self.assertEqual(self.dep_path(6, 5), "a_very_long_label@")
+
+    # Ties are broken in favor of the first word of entity1, then of the first
+    # word of entity2, in both cases
+    def test_ties(self):
+        for parent5, parent6 in [(-1, -1), (6, 5)]:
+            sentence = make_sentence(self.DEP_PATHS,
+                                     [4, 4, 4, 4, -1, parent5, parent6])
+            entity1 = Mention("ENTITY", "E1", sentence.words[0:2])
+            entity2 = Mention("ENTITY", "E2", sentence.words[2:4])
+            self.assertEqual(sentence.dep_path(entity1, entity2),
+                             "a_very_long_label@b")
+
+
+if __name__ == "__main__":
+    unittest.main()
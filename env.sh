@@ -22,6 +22,9 @@ export PARALLELISM=90
 export SENTENCES=95022507
 # The input batch size for extractors working on the sentences table
 export SENTENCES_BATCH_SIZE=`echo  "(" ${SENTENCES} "/" ${PARALLELISM} ") + 1" | bc`
+# Set to 1 to have the extractors share memory-mapped copies of the
+# dictionaries instead of loading them in each process (see dicts/README.md)
+export SHARED_DICTS=0
 
 
 # Database Configuration